@@ -1,36 +1,81 @@
 from datetime import datetime, timedelta
-from typing import Optional, Generator
+from collections import OrderedDict
+from typing import Any, AsyncGenerator, Callable, Optional, Generator
 import hashlib
 import secrets
+import threading
+import time
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from .config import settings
 from .database import get_db
 from .models import User
-from .user_database import get_user_session_factory, get_user_upload_dir
+from .user_database import get_user_session_factory, get_user_upload_dir, user_write_session_async
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Password hashes are "pbkdf2_sha256$<iterations>$<salt>$<hash>". Older hashes
+# are "<salt>$<hash>" and always used LEGACY_HASH_ITERATIONS.
+HASH_ALGORITHM = "pbkdf2_sha256"
+LEGACY_HASH_ITERATIONS = 100000
+
+# hashlib releases the GIL while deriving keys, so hashes run in parallel on the
+# request threads that need them. The semaphore bounds how many run at once;
+# requests beyond that fail fast instead of holding a thread while they wait.
+_hash_slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_WORKERS)
+
+def _pbkdf2(password: str, salt: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac(
+        "sha256", password.encode(), salt.encode(), iterations
+    ).hex()
+
+def _run_hash(password: str, salt: str, iterations: int) -> str:
+    """Run a PBKDF2 derivation in this thread, or raise 503 if too many are running."""
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        return _pbkdf2(password, salt, iterations)
+    finally:
+        _hash_slots.release()
+
+def _parse_hash(hashed_password: str):
+    parts = hashed_password.split("$")
+    if len(parts) == 2:
+        salt, stored_hash = parts
+        return LEGACY_HASH_ITERATIONS, salt, stored_hash
+    algorithm, iterations, salt, stored_hash = parts
+    if algorithm != HASH_ALGORITHM:
+        raise ValueError(f"Unknown hash algorithm: {algorithm}")
+    return int(iterations), salt, stored_hash
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash using PBKDF2-SHA256."""
     try:
-        salt, stored_hash = hashed_password.split("$")
-        computed_hash = hashlib.pbkdf2_hmac(
-            "sha256", plain_password.encode(), salt.encode(), 100000
-        ).hex()
-        return secrets.compare_digest(computed_hash, stored_hash)
+        iterations, salt, stored_hash = _parse_hash(hashed_password)
     except (ValueError, AttributeError):
         return False
+    computed_hash = _run_hash(plain_password, salt, iterations)
+    return secrets.compare_digest(computed_hash, stored_hash)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Whether a stored hash predates the current format or iteration count."""
+    if not hashed_password.startswith(f"{HASH_ALGORITHM}$"):
+        return True
+    iterations, _, _ = _parse_hash(hashed_password)
+    return iterations != settings.PASSWORD_HASH_ITERATIONS
 
 def get_password_hash(password: str) -> str:
     """Hash a password using PBKDF2-SHA256."""
     salt = secrets.token_hex(16)
-    password_hash = hashlib.pbkdf2_hmac(
-        "sha256", password.encode(), salt.encode(), 100000
-    ).hex()
-    return f"{salt}${password_hash}"
+    iterations = settings.PASSWORD_HASH_ITERATIONS
+    password_hash = _run_hash(password, salt, iterations)
+    return f"{HASH_ALGORITHM}${iterations}${salt}${password_hash}"
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -65,7 +110,88 @@ def verify_token(token: str, token_type: str = "access") -> Optional[dict]:
     except JWTError:
         return None
 
-async def get_current_user(
+class TTLCache:
+    """A small thread-safe LRU cache whose entries expire after a TTL."""
+    
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def discard_where(self, predicate: Callable[[Any], bool]):
+        with self._lock:
+            for key in [k for k, (value, _) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Decoded access tokens (token -> payload) and active users (id -> column values)
+_token_cache = TTLCache(settings.AUTH_CACHE_MAX_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+_user_cache = TTLCache(settings.AUTH_CACHE_MAX_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+
+def invalidate_user_cache(user_id: int):
+    """Forget a user's cached snapshot and tokens. Call after changing or deleting the user."""
+    _user_cache.discard(user_id)
+    _token_cache.discard_where(lambda payload: payload.get("sub") == str(user_id))
+
+def clear_auth_cache():
+    _token_cache.clear()
+    _user_cache.clear()
+
+def _decode_access_token(token: str) -> Optional[dict]:
+    payload = _token_cache.get(token)
+    if payload is None:
+        payload = verify_token(token, "access")
+        if payload is None:
+            return None
+        _token_cache.set(token, payload, payload["exp"] - time.time())
+    return payload
+
+def _load_user(db: Session, user_id: int) -> Optional[User]:
+    """
+    Return the user, from the snapshot cache when possible.
+    Cached users are transient copies; routes that modify the user must
+    reload it through their own session.
+    """
+    snapshot = _user_cache.get(user_id)
+    if snapshot is not None:
+        return User(**snapshot)
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is not None and user.is_active:
+        _user_cache.set(user_id, {column.key: getattr(user, column.key) for column in User.__table__.columns})
+    return user
+
+def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> User:
@@ -75,15 +201,16 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    payload = verify_token(token, "access")
+    payload = _decode_access_token(token)
     if payload is None:
         raise credentials_exception
     
-    user_id: int = payload.get("sub")
-    if user_id is None:
+    try:
+        user_id = int(payload.get("sub"))
+    except (TypeError, ValueError):
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = _load_user(db, user_id)
     if user is None:
         raise credentials_exception
     
@@ -95,12 +222,12 @@ async def get_current_user(
     
     return user
 
-async def get_current_user_optional(
+def get_current_user_optional(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> Optional[User]:
     try:
-        return await get_current_user(token, db)
+        return get_current_user(token, db)
     except HTTPException:
         return None
 
@@ -127,6 +254,19 @@ def get_current_user_db(current_user: User = Depends(get_current_user)) -> Gener
         db.close()
 
 
+async def get_current_user_write_db(
+    response: Response,
+    current_user: User = Depends(get_current_user)
+) -> AsyncGenerator[Session, None]:
+    """
+    Get a write session for the current user's database, holding their write lock.
+    Requests waiting for the lock wait on the event loop, not in the threadpool.
+    """
+    async with user_write_session_async(current_user.username) as db:
+        response.headers["Server-Timing"] = f"db-lock;dur={db.info['lock_wait'] * 1000:.1f}"
+        yield db
+
+
 def get_current_user_upload_dir(current_user: User = Depends(get_current_user)) -> str:
     """Get the upload directory for the current user."""
     return get_user_upload_dir(current_user.username)
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import List
 import os
 
 class Settings(BaseSettings):
@@ -12,9 +13,55 @@ class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./recipe_app.db"
     UPLOAD_DIR: str = "uploads"
     MAX_UPLOAD_SIZE: int = 5 * 1024 * 1024  # 5MB
+    IMAGE_WORKERS: int = 2  # Processes decoding and resizing uploaded images
+    IMAGE_MAX_DIMENSION: int = 1200  # Longest side of a processed image, in pixels
+    IMAGE_QUALITY: int = 85
+    IMAGE_VARIANT_WIDTHS: List[int] = [320, 640, 1200]  # Responsive widths written in WebP and the original format
+    IMAGE_PLACEHOLDER_SIZE: int = 20  # Longest side of the inline placeholder, in pixels
+    UPLOAD_GC_INTERVAL_HOURS: int = 24  # Between sweeps for unreferenced upload files; 0 disables
+    UPLOAD_GC_GRACE_SECONDS: int = 3600  # Files younger than this are never swept
+    UPLOAD_GC_WORKERS: int = 4  # Concurrent file operations during a sweep
     ALLOWED_EXTENSIONS: set = {"jpg", "jpeg", "png", "gif", "webp"}
+    MAX_BULK_RECIPES: int = 500  # Recipes per POST /api/recipes/bulk request
+    EXPORT_BATCH_SIZE: int = 200  # Rows fetched per round trip while exporting
+    EXPORT_CHUNK_SIZE: int = 64 * 1024  # Bytes per streamed export chunk
+    IMPORT_BATCH_SIZE: int = 100  # Recipes committed per import transaction
+    IMPORT_MAX_DOCUMENT_SIZE: int = 1024 * 1024  # Largest single document in an import
+    IMPORT_MAX_ERRORS: int = 100  # Per-document errors kept in an import report
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:5173"  # Comma-separated list of allowed origins
     
+    # SQLite connection profile applied to the central and per-user databases:
+    # "tuned" (WAL, mmap, larger cache...) or "default" (SQLite's own settings)
+    SQLITE_PROFILE: str = "tuned"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # bytes
+    SQLITE_CACHE_SIZE: int = -16000  # negative = KiB, so ~16MB per connection
+    SQLITE_BUSY_TIMEOUT: int = 5000  # ms
+    
+    # Per-user database engines kept open at once (LRU), and how long an unused
+    # engine may stay open
+    USER_ENGINE_CACHE_SIZE: int = 256
+    USER_ENGINE_IDLE_TIMEOUT: int = 600  # seconds
+    
+    # Writes to a user database hold a per-user lock and start with BEGIN IMMEDIATE,
+    # retried with jittered exponential backoff while the file is busy
+    USER_WRITE_RETRIES: int = 5
+    USER_WRITE_BACKOFF_BASE: float = 0.05  # seconds
+    USER_WRITE_MAX_WAIT: float = 10.0  # seconds in SQLite's busy wait and retries before a 503
+    
+    # In-process cache of decoded access tokens and active user snapshots.
+    # Entries are invalidated on account changes in this process and expire
+    # after the TTL everywhere else (other workers).
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_MAX_SIZE: int = 10000
+    
+    # Password hashing (PBKDF2-SHA256). Hashes run on a dedicated bounded pool;
+    # requests beyond workers + queue depth are rejected with 503.
+    PASSWORD_HASH_ITERATIONS: int = 100000
+    PASSWORD_HASH_WORKERS: int = 4  # Password hashes computed at once; more get a 503
+    
+    # Route handlers doing database work are sync and run in this many worker threads
+    THREADPOOL_SIZE: int = 40
+    
     # Initial admin user (from environment variables)
     ADMIN_EMAIL: str = "admin@recipe.app"
     ADMIN_USERNAME: str = "admin"
@@ -1,12 +1,41 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
 
-engine = create_engine(
+# PRAGMAs run on every new SQLite connection, by profile name
+SQLITE_PROFILES = {
+    "default": {},
+    "tuned": {
+        "journal_mode": "WAL",  # readers no longer block the writer
+        "synchronous": "NORMAL",  # fsync at checkpoints only; safe with WAL
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "temp_store": "MEMORY",
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+        "foreign_keys": "ON",
+    },
+}
+
+def apply_sqlite_profile(engine, profile: str = None):
+    """Set the configured PRAGMAs on each connection the engine opens."""
+    if engine.dialect.name != "sqlite":
+        return engine
+    pragmas = SQLITE_PROFILES[profile or settings.SQLITE_PROFILE]
+    
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+    
+    return engine
+
+engine = apply_sqlite_profile(create_engine(
     settings.DATABASE_URL,
     connect_args={"check_same_thread": False}  # SQLite specific
-)
+))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
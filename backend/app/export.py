@@ -0,0 +1,176 @@
+"""
+Streaming export of a user's recipe library.
+Recipes are read from the per-user database in yield_per batches and written out
+as NDJSON, an ingredients CSV, or a zip that also carries the user's images, so
+memory use does not grow with the size of the library.
+"""
+import csv
+import io
+import os
+import zipfile
+from typing import Callable, Iterator, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+
+from .config import settings
+from .image_store import image_srcset
+from .schemas import RecipeResponse
+from .user_database import Recipe, Ingredient
+
+INGREDIENT_CSV_COLUMNS = ("recipe_id", "recipe_title", "ingredient_id", "name", "quantity", "unit", "notes")
+
+
+def iter_recipes(db: Session) -> Iterator[Recipe]:
+    """Every recipe with its children, fetched in batches of EXPORT_BATCH_SIZE."""
+    query = select(Recipe).options(
+        selectinload(Recipe.ingredients),
+        selectinload(Recipe.instructions),
+        selectinload(Recipe.tags),
+        selectinload(Recipe.folders),
+        selectinload(Recipe.favorites)
+    ).order_by(Recipe.id).execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    for recipe in db.execute(query).scalars():
+        yield recipe
+
+
+def recipe_line(recipe: Recipe) -> bytes:
+    """One NDJSON line in RecipeResponse shape."""
+    response = RecipeResponse(
+        id=recipe.id,
+        title=recipe.title,
+        description=recipe.description,
+        image_url=recipe.image_url,
+        image_status=recipe.image_status,
+        image_srcset=image_srcset(recipe.image_url, recipe.image_variants),
+        image_placeholder=recipe.image_placeholder,
+        prep_time=recipe.prep_time,
+        cook_time=recipe.cook_time,
+        servings=recipe.servings,
+        difficulty=recipe.difficulty,
+        created_at=recipe.created_at,
+        updated_at=recipe.updated_at,
+        ingredients=recipe.ingredients,
+        instructions=sorted(recipe.instructions, key=lambda x: x.step_number),
+        tags=recipe.tags,
+        folders=recipe.folders,
+        is_favorite=bool(recipe.favorites)
+    )
+    return response.model_dump_json().encode() + b"\n"
+
+
+def _write_ndjson(db: Session, write: Callable[[bytes], object]) -> Iterator[None]:
+    for recipe in iter_recipes(db):
+        write(recipe_line(recipe))
+        yield
+
+
+def _write_ingredients_csv(db: Session, write: Callable[[bytes], object]) -> Iterator[None]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(INGREDIENT_CSV_COLUMNS)
+    query = select(Ingredient, Recipe.title).join(Recipe, Ingredient.recipe_id == Recipe.id).order_by(
+        Ingredient.recipe_id, Ingredient.id
+    ).execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    for ingredient, title in db.execute(query):
+        writer.writerow((
+            ingredient.recipe_id, title, ingredient.id, ingredient.name,
+            ingredient.quantity, ingredient.unit, ingredient.notes
+        ))
+        if buffer.tell() >= settings.EXPORT_CHUNK_SIZE:
+            write(buffer.getvalue().encode())
+            buffer.seek(0)
+            buffer.truncate()
+            yield
+    write(buffer.getvalue().encode())
+    yield
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable file that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        return len(data)
+
+    def ready(self) -> bool:
+        return self._size >= settings.EXPORT_CHUNK_SIZE
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        return data
+
+
+def _buffered(produce: Callable[[Callable[[bytes], object]], Iterator[None]]) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    for _ in produce(sink.write):
+        if sink.ready():
+            yield sink.drain()
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def stream_ndjson(session_factory) -> Iterator[bytes]:
+    """Every recipe as one JSON document per line."""
+    db = session_factory()
+    try:
+        yield from _buffered(lambda write: _write_ndjson(db, write))
+    finally:
+        db.close()
+
+
+def stream_ingredients_csv(session_factory) -> Iterator[bytes]:
+    """Every ingredient with its recipe id and title, as CSV."""
+    db = session_factory()
+    try:
+        yield from _buffered(lambda write: _write_ingredients_csv(db, write))
+    finally:
+        db.close()
+
+
+def stream_zip(session_factory, upload_dir: str) -> Iterator[bytes]:
+    """
+    A zip holding recipes.ndjson, ingredients.csv and the images the recipes use.
+    The archive is written to a non-seekable sink, so zipfile emits each entry's
+    sizes after its data and nothing has to be buffered beyond one chunk.
+    """
+    db = session_factory()
+    sink = _ChunkSink()
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, produce in (("recipes.ndjson", _write_ndjson), ("ingredients.csv", _write_ingredients_csv)):
+                with archive.open(name, "w") as entry:
+                    for _ in produce(db, entry.write):
+                        if sink.ready():
+                            yield sink.drain()
+
+            query = select(Recipe.image_url).where(Recipe.image_url.isnot(None)).distinct().order_by(
+                Recipe.image_url
+            ).execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+            for image_url in db.execute(query).scalars():
+                filename = os.path.basename(image_url)
+                path = os.path.join(upload_dir, filename)
+                if not os.path.isfile(path):
+                    continue
+                # Images are already compressed
+                info = zipfile.ZipInfo.from_file(path, f"images/{filename}")
+                info.compress_type = zipfile.ZIP_STORED
+                with open(path, "rb") as source, archive.open(info, "w") as entry:
+                    while chunk := source.read(settings.EXPORT_CHUNK_SIZE):
+                        entry.write(chunk)
+                        if sink.ready():
+                            yield sink.drain()
+        yield sink.drain()
+    finally:
+        db.close()
@@ -0,0 +1,205 @@
+"""
+Background processing of uploaded recipe images.
+
+Uploads are staged under the user's upload directory and queued here, one job
+per distinct content hash (see image_store). Decoding and resizing run in a
+process pool so large photos neither block request threads nor contend for the
+GIL. Each job writes the resized image, its responsive variants
+(IMAGE_VARIANT_WIDTHS, in WebP and the original format) and an inline
+placeholder, then attaches the blob to every recipe whose image_job is that
+hash. A recipe that gets a newer upload, or is deleted, stops waiting and is
+not touched by a late job.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Optional, Set, Tuple
+
+from .config import settings
+from .image_processing import process_image
+from .image_store import IMAGE_FAILED, attach_image, image_files, remove_image_files
+from .user_database import ImageBlob, Recipe, get_user_upload_dir, user_write_session
+
+logger = logging.getLogger(__name__)
+
+# Staged uploads waiting for processing, inside each user's upload directory
+INCOMING_DIR = ".incoming"
+
+# Attempts at recording a job's result before its recipes are marked failed
+FINISH_ATTEMPTS = 3
+FINISH_RETRY_DELAY = 1.0  # seconds, doubled after each attempt
+
+# Job threads wait on the process pool and then record the result in the user's database
+_job_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix="image-job")
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+_jobs: Set[Future] = set()
+_running: Dict[Tuple[str, str], object] = {}  # (username, content hash) -> token of the queued or running job
+_jobs_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Start the worker processes on first use; spawn avoids forking a threaded server."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def get_incoming_dir(username: str) -> str:
+    """Where a user's uploads are staged while they arrive and until processed."""
+    incoming_dir = os.path.join(get_user_upload_dir(username), INCOMING_DIR)
+    os.makedirs(incoming_dir, exist_ok=True)
+    return incoming_dir
+
+
+def staging_path(username: str, digest: str) -> str:
+    """Where an upload waits until its job picks it up."""
+    return os.path.join(get_incoming_dir(username), digest)
+
+
+def _remove(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _release(username: str, digest: str, job: Optional[object]) -> None:
+    """Let the same content be queued again, unless a newer job already holds the key."""
+    with _jobs_lock:
+        if job is not None and _running.get((username, digest)) is job:
+            del _running[(username, digest)]
+
+
+def finish_image_job(username: str, digest: str, filename: Optional[str], result: Optional[dict] = None,
+                     job: Optional[object] = None) -> None:
+    """
+    Record a processed blob and attach it to every recipe still waiting for it,
+    or mark those recipes failed. Recipes that moved on to another upload (or
+    were deleted) are no longer waiting and are left alone.
+    
+    The job is released before committing, while the user's write lock is
+    held: an upload of the same content that commits after this sees either
+    the processed blob or no blob, and can queue a new job for the latter.
+    """
+    upload_dir = get_user_upload_dir(username)
+    unused = []
+    with user_write_session(username) as db:
+        blob = db.get(ImageBlob, digest)
+        waiting = db.query(Recipe).filter(Recipe.image_job == digest).all()
+        if blob is None or filename is None:
+            for recipe in waiting:
+                recipe.image_status = IMAGE_FAILED
+                recipe.image_job = None
+            if blob is not None and blob.filename is None:
+                db.delete(blob)
+        else:
+            blob.filename = filename
+            blob.variants = json.dumps(result["variants"]) if result["variants"] else None
+            blob.placeholder = result["placeholder"]
+            for recipe in waiting:
+                unused += attach_image(db, recipe, blob, username)
+            if blob.ref_count == 0:
+                db.delete(blob)
+                unused += image_files(blob.filename, blob.variants)
+        _release(username, digest, job)
+        db.commit()
+
+    remove_image_files(upload_dir, unused)
+
+
+def _record_result(username: str, digest: str, filename: Optional[str], result: Optional[dict],
+                   job: Optional[object] = None) -> None:
+    """
+    finish_image_job, retried if the database is busy or unavailable. If the
+    result still cannot be recorded, the waiting recipes are marked failed
+    rather than left processing; files already written are left to the upload
+    sweep (upload_gc).
+    """
+    delay = FINISH_RETRY_DELAY
+    for attempt in range(1, FINISH_ATTEMPTS + 1):
+        try:
+            finish_image_job(username, digest, filename, result, job)
+            return
+        except Exception:
+            logger.exception("Recording image %s for %s failed (attempt %d of %d)",
+                             digest, username, attempt, FINISH_ATTEMPTS)
+        if attempt < FINISH_ATTEMPTS:
+            time.sleep(delay)
+            delay *= 2
+    if filename is not None:
+        finish_image_job(username, digest, None, job=job)
+
+
+def _process(username: str, digest: str, filename: str) -> Optional[dict]:
+    """process_image in the pool, or None if the image could not be processed."""
+    source = staging_path(username, digest)
+    destination = os.path.join(get_user_upload_dir(username), filename)
+    try:
+        return get_process_pool().submit(
+            process_image, source, destination, settings.IMAGE_MAX_DIMENSION,
+            settings.IMAGE_QUALITY, settings.IMAGE_VARIANT_WIDTHS, settings.IMAGE_PLACEHOLDER_SIZE
+        ).result()
+    except Exception:
+        # Unreadable image or a crashed worker: keep the current images
+        logger.warning("Processing image %s for %s failed", digest, username, exc_info=True)
+        _remove(source)
+        _remove(destination)
+        return None
+
+
+def run_image_job(username: str, digest: str, filename: str, job: object) -> None:
+    try:
+        result = _process(username, digest, filename)
+        _record_result(username, digest, filename if result is not None else None, result, job)
+    finally:
+        # Normally released by finish_image_job already
+        _release(username, digest, job)
+
+
+def submit_image_job(username: str, digest: str, filename: str) -> Optional[Future]:
+    """
+    Queue processing of the upload staged at staging_path(username, digest).
+    Does nothing if that content is already being processed.
+    """
+    job = object()
+    with _jobs_lock:
+        if (username, digest) in _running:
+            return None
+        _running[(username, digest)] = job
+    future = _job_executor.submit(run_image_job, username, digest, filename, job)
+    with _jobs_lock:
+        _jobs.add(future)
+    future.add_done_callback(_forget_job)
+    return future
+
+
+def _forget_job(future: Future) -> None:
+    with _jobs_lock:
+        _jobs.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Image job failed", exc_info=future.exception())
+
+
+def wait_for_image_jobs(timeout: Optional[float] = None) -> None:
+    """Block until queued image jobs have finished."""
+    with _jobs_lock:
+        pending = list(_jobs)
+    wait(pending, timeout=timeout)
+
+
+def shutdown_image_jobs() -> None:
+    """Let running jobs finish, then stop the worker processes."""
+    global _process_pool
+    wait_for_image_jobs()
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown()
+            _process_pool = None
@@ -0,0 +1,100 @@
+"""
+Image decoding and resizing for recipe uploads.
+These functions run in worker processes (see image_jobs), so they take and
+return plain values and import nothing from the web app.
+"""
+import base64
+import io
+import os
+from typing import Dict, Iterable
+
+from PIL import Image, ImageOps
+
+WEBP_MIME_TYPE = "image/webp"
+
+
+def _format(img: Image.Image) -> str:
+    # Multi-picture JPEGs from phone cameras are saved as plain JPEG
+    return "JPEG" if img.format == "MPO" else img.format
+
+
+def _save(img: Image.Image, path: str, image_format: str, quality: int) -> None:
+    """Write next to path and rename into place, so path never holds a partial file."""
+    partial = f"{path}.partial"
+    try:
+        img.save(partial, format=image_format, quality=quality, optimize=True)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+def generate_variants(path: str, quality: int, widths: Iterable[int]) -> Dict[str, Dict[str, str]]:
+    """
+    Write narrower copies of the image at path, in WebP and in its own format.
+
+    Returns {mime type: {width: filename}}, including the image itself at its
+    own width. Widths at or above the image's width are skipped, and a WebP
+    copy at full width is always written.
+    """
+    stem, ext = os.path.splitext(path)
+    with Image.open(path) as img:
+        image_format = _format(img)
+        original_type = Image.MIME[image_format]
+        source = ImageOps.exif_transpose(img)
+
+    variants = {original_type: {str(source.width): os.path.basename(path)}}
+    webp_widths = sorted({width for width in widths if width < source.width} | {source.width})
+    for width in webp_widths:
+        height = max(1, round(source.height * width / source.width))
+        resized = source if width == source.width else source.resize((width, height), Image.Resampling.LANCZOS)
+        if original_type != WEBP_MIME_TYPE:
+            filename = f"{stem}-{width}.webp"
+            _save(resized, filename, "WEBP", quality)
+            variants.setdefault(WEBP_MIME_TYPE, {})[str(width)] = os.path.basename(filename)
+        if width < source.width:
+            filename = f"{stem}-{width}{ext}"
+            _save(resized, filename, image_format, quality)
+            variants[original_type][str(width)] = os.path.basename(filename)
+    return variants
+
+
+def make_placeholder(path: str, size: int) -> str:
+    """A tiny WebP of the image as a data URI, to paint while the real image loads."""
+    with Image.open(path) as img:
+        small = ImageOps.exif_transpose(img)
+        small.thumbnail((size, size))
+    if small.mode not in ("RGB", "RGBA"):
+        small = small.convert("RGBA" if "transparency" in small.info or small.mode in ("LA", "PA") else "RGB")
+    buffer = io.BytesIO()
+    small.save(buffer, format="WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def process_image(source: str, destination: str, max_dimension: int, quality: int,
+                  widths: Iterable[int], placeholder_size: int) -> dict:
+    """
+    Decode an uploaded image, shrink it to fit max_dimension, move it to
+    destination and write its responsive variants alongside.
+
+    Images that already fit are moved as-is after a full decode. Raises if the
+    upload is not a readable image. Returns {"variants": (as generate_variants),
+    "placeholder": (as make_placeholder)}.
+    """
+    with Image.open(source) as img:
+        img.load()
+        fits = img.width <= max_dimension and img.height <= max_dimension
+        if not fits:
+            resized = ImageOps.exif_transpose(img)
+            resized.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            _save(resized, destination, _format(img), quality)
+
+    if fits:
+        os.replace(source, destination)
+    else:
+        os.remove(source)
+    return {
+        "variants": generate_variants(destination, quality, widths),
+        "placeholder": make_placeholder(destination, placeholder_size),
+    }
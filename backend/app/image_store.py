@@ -0,0 +1,86 @@
+"""
+Content-addressed storage for recipe images.
+
+Uploads are keyed by the SHA-256 of their bytes, so the same photo attached to
+several recipes (or uploaded again) is stored and processed once. Each distinct
+image is an ImageBlob row in the user's database whose ref_count tracks the
+recipes using it. Functions here change rows only; they return the files that
+became unreferenced so callers can delete them after committing.
+"""
+import json
+import os
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .user_database import ImageBlob, Recipe
+
+IMAGE_PROCESSING = "processing"
+IMAGE_READY = "ready"
+IMAGE_FAILED = "failed"
+
+
+def image_files(image_url: Optional[str], image_variants: Optional[str]) -> List[str]:
+    """Every file name belonging to an image: the image itself and its variants."""
+    names = {os.path.basename(image_url)} if image_url else set()
+    for widths in json.loads(image_variants or "{}").values():
+        names.update(widths.values())
+    return sorted(names)
+
+
+def remove_image_files(upload_dir: str, filenames: List[str]) -> None:
+    for filename in filenames:
+        path = os.path.join(upload_dir, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def image_srcset(image_url: Optional[str], image_variants: Optional[str]) -> Dict[str, str]:
+    """
+    srcset strings keyed by MIME type, narrowest first, for <picture><source type=... srcset=...>.
+    Variant files live next to image_url.
+    """
+    if not image_url or not image_variants:
+        return {}
+    base_url = image_url.rsplit("/", 1)[0]
+    return {
+        mime_type: ", ".join(
+            f"{base_url}/{filename} {width}w"
+            for width, filename in sorted(widths.items(), key=lambda item: int(item[0]))
+        )
+        for mime_type, widths in json.loads(image_variants).items()
+    }
+
+
+def release_image(db: Session, recipe: Recipe) -> List[str]:
+    """
+    Drop the recipe's reference to its current image.
+    Returns the files to delete: the blob's once nobody uses it, or the
+    recipe's own files for images that predate the blob store.
+    """
+    if recipe.image_hash is None:
+        return image_files(recipe.image_url, recipe.image_variants)
+    blob = db.get(ImageBlob, recipe.image_hash)
+    if blob is None:
+        return []
+    blob.ref_count -= 1
+    if blob.ref_count > 0:
+        return []
+    db.delete(blob)
+    return image_files(blob.filename, blob.variants)
+
+
+def attach_image(db: Session, recipe: Recipe, blob: ImageBlob, username: str) -> List[str]:
+    """Point the recipe at a processed blob. Returns files its previous image no longer needs."""
+    if recipe.image_hash == blob.hash:
+        unused = []
+    else:
+        unused = release_image(db, recipe)
+        blob.ref_count += 1
+    recipe.image_url = f"/uploads/{username}/{blob.filename}"
+    recipe.image_variants = blob.variants
+    recipe.image_placeholder = blob.placeholder
+    recipe.image_hash = blob.hash
+    recipe.image_status = IMAGE_READY
+    recipe.image_job = None
+    return unused
@@ -0,0 +1,314 @@
+"""
+Incremental parsing for recipe imports.
+Request bodies are read chunk by chunk and turned into RecipeCreate-shaped dicts
+one document at a time, so memory stays flat however large the upload is.
+Accepts NDJSON (one document per line) or JSON (a single document, or an array
+of them). Documents may be schema.org Recipe JSON-LD or this app's own export format.
+"""
+import codecs
+import html
+import json
+import re
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+from .config import settings
+
+_DURATION_RE = re.compile(
+    r"^P(?:(?P<weeks>\d+(?:\.\d+)?)W)?(?:(?P<days>\d+(?:\.\d+)?)D)?"
+    r"(?:T(?:(?P<hours>\d+(?:\.\d+)?)H)?(?:(?P<minutes>\d+(?:\.\d+)?)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$",
+    re.IGNORECASE
+)
+_DURATION_SECONDS = {"weeks": 604800, "days": 86400, "hours": 3600, "minutes": 60, "seconds": 1}
+_NUMBER_RE = re.compile(r"\d+")
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+class ImportFormatError(ValueError):
+    """A document in the upload could not be read."""
+
+
+def parse_duration(value: Any) -> Optional[int]:
+    """ISO-8601 duration (e.g. PT1H30M) in whole minutes; numbers are taken as minutes."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    if not isinstance(value, str):
+        return None
+    match = _DURATION_RE.match(value.strip())
+    if not match or not any(match.groupdict().values()):
+        return None
+    seconds = sum(float(amount) * _DURATION_SECONDS[unit] for unit, amount in match.groupdict().items() if amount)
+    return round(seconds / 60)
+
+
+def _text(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        value = value.get("text") or value.get("name")
+    if not isinstance(value, str):
+        return None
+    # Unescape first, so escaped markup is stripped as well rather than revealed
+    value = _TAG_RE.sub(" ", html.unescape(value))
+    return " ".join(value.split()) or None
+
+
+def _as_list(value: Any) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _servings(value: Any) -> Optional[int]:
+    for item in _as_list(value):
+        if isinstance(item, int) and not isinstance(item, bool):
+            return item
+        match = _NUMBER_RE.search(str(item))
+        if match:
+            return int(match.group())
+    return None
+
+
+def _steps(value: Any) -> Iterator[str]:
+    """Flatten recipeInstructions: text, HowToStep and (nested) HowToSection."""
+    if isinstance(value, str):
+        for line in value.splitlines():
+            text = _text(line)
+            if text:
+                yield text
+        return
+    for item in _as_list(value):
+        if isinstance(item, dict) and "itemListElement" in item:
+            yield from _steps(item["itemListElement"])
+        else:
+            text = _text(item)
+            if text:
+                yield text
+
+
+def _keywords(value: Any) -> List[str]:
+    names = []
+    for item in _as_list(value):
+        if isinstance(item, str):
+            names.extend(part.strip() for part in item.split(","))
+    return [name for name in names if name]
+
+
+def _is_recipe(document: dict) -> bool:
+    return "Recipe" in _as_list(document.get("@type"))
+
+
+def recipe_from_jsonld(document: dict) -> dict:
+    """Map a schema.org Recipe onto RecipeCreate fields."""
+    return {
+        "title": _text(document.get("name")) or "",
+        "description": _text(document.get("description")),
+        "prep_time": parse_duration(document.get("prepTime")),
+        "cook_time": parse_duration(document.get("cookTime")),
+        "servings": _servings(document.get("recipeYield")),
+        "ingredients": [
+            {"name": name} for name in map(_text, _as_list(document.get("recipeIngredient"))) if name
+        ],
+        "instructions": [
+            {"step_number": number, "content": content}
+            for number, content in enumerate(_steps(document.get("recipeInstructions")), start=1)
+        ],
+        "tags": list(dict.fromkeys(
+            _keywords(document.get("keywords"))
+            + _keywords(document.get("recipeCategory"))
+            + _keywords(document.get("recipeCuisine"))
+        )),
+    }
+
+
+def recipe_from_export(document: dict) -> dict:
+    """Map a line of this app's NDJSON export onto RecipeCreate fields."""
+    data = {key: value for key, value in document.items() if key not in ("id", "folders", "tags")}
+    data["tags"] = [tag["name"] if isinstance(tag, dict) else tag for tag in document.get("tags", [])]
+    for child in ("ingredients", "instructions"):
+        data[child] = [
+            {key: value for key, value in item.items() if key != "id"} if isinstance(item, dict) else item
+            for item in document.get(child, [])
+        ]
+    return data
+
+
+def extract_recipes(value: Any) -> Iterator[dict]:
+    """RecipeCreate-shaped dicts for every recipe in a parsed document."""
+    if isinstance(value, list):
+        for item in value:
+            yield from extract_recipes(item)
+    elif isinstance(value, dict):
+        if "@graph" in value:
+            yield from extract_recipes(value["@graph"])
+        elif _is_recipe(value):
+            yield recipe_from_jsonld(value)
+        elif "@type" not in value:
+            yield recipe_from_export(value)
+
+
+# Characters that change nesting inside a JSON container, outside or inside strings
+_STRUCTURE_RE = re.compile(r'[\[\]{}"]')
+_STRING_END_RE = re.compile(r'["\\]')
+
+
+class NdjsonReader:
+    """
+    Splits an NDJSON byte stream into (line number, parsed value) for each
+    non-blank line. A bad line gives an ImportFormatError in place of its value
+    and reading carries on.
+    """
+
+    def __init__(self):
+        self.buffer = b""
+        self.line_number = 0
+        self.skipping = False
+
+    @staticmethod
+    def _parse(line: bytes):
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            return ImportFormatError(f"Invalid JSON: {e}")
+
+    def feed(self, chunk: bytes) -> Iterator[Tuple[int, Union[Any, ImportFormatError]]]:
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split(b"\n")
+        for line in lines:
+            self.line_number += 1
+            if self.skipping:
+                self.skipping = False
+                yield self.line_number, ImportFormatError("Line too long")
+            elif line.strip():
+                yield self.line_number, self._parse(line)
+        if len(self.buffer) > settings.IMPORT_MAX_DOCUMENT_SIZE:
+            self.buffer = b""
+            self.skipping = True
+
+    def close(self) -> Iterator[Tuple[int, Union[Any, ImportFormatError]]]:
+        self.line_number += 1
+        if self.skipping:
+            yield self.line_number, ImportFormatError("Line too long")
+        elif self.buffer.strip():
+            yield self.line_number, self._parse(self.buffer)
+
+
+class JsonReader:
+    """
+    Splits a JSON byte stream into (index, parsed value): each element of a
+    top-level array, or each top-level value otherwise. Elements are decoded as
+    soon as they are complete, so only one element is buffered at a time, and
+    an incomplete element is scanned only for the text that has arrived since
+    the last chunk. A malformed or oversized element raises ImportFormatError.
+    """
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.json = json.JSONDecoder()
+        self.buffer = ""
+        self.in_array = None
+        self.expect_value = True
+        self.finished = False
+        self.index = 0
+        # Progress through an incomplete container at the start of the buffer
+        self.scanned = 0
+        self.depth = 0
+        self.in_string = False
+
+    def _skip_space(self, pos: int) -> int:
+        while pos < len(self.buffer) and self.buffer[pos].isspace():
+            pos += 1
+        return pos
+
+    def _container_end(self, start: int) -> Optional[int]:
+        """End of the container starting at start, or None if it has not all arrived."""
+        buffer = self.buffer
+        pos = max(start, self.scanned)
+        while True:
+            match = (_STRING_END_RE if self.in_string else _STRUCTURE_RE).search(buffer, pos)
+            if match is None:
+                self.scanned = len(buffer)
+                return None
+            char = match.group()
+            pos = match.end()
+            if self.in_string:
+                if char == "\\":
+                    if pos == len(buffer):
+                        # Escaped character not here yet: rescan the backslash
+                        self.scanned = pos - 1
+                        return None
+                    pos += 1
+                else:
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "[{":
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    return pos
+
+    def _check_incomplete(self, pos: int, final: bool) -> None:
+        """Raise if the partial value at pos is too large, or can no longer be completed."""
+        if len(self.buffer) - pos > settings.IMPORT_MAX_DOCUMENT_SIZE:
+            raise ImportFormatError(f"Item {self.index} is too large or malformed")
+        if final:
+            try:
+                self.json.raw_decode(self.buffer, pos)
+            except ValueError as e:
+                raise ImportFormatError(f"Invalid JSON in item {self.index}: {e.msg}")
+
+    def _values(self, final: bool) -> Iterator[Tuple[int, Any]]:
+        pos = self._skip_space(0)
+        while pos < len(self.buffer) and not self.finished:
+            char = self.buffer[pos]
+            if self.in_array is None:
+                self.in_array = char == "["
+                pos = self._skip_space(pos + 1) if self.in_array else pos
+                continue
+            if self.in_array and char == "]" and (self.expect_value is False or self.index == 0):
+                self.finished = True
+                pos += 1
+                break
+            if self.in_array and not self.expect_value:
+                if char != ",":
+                    raise ImportFormatError(f"Expected ',' or ']' after item {self.index - 1}")
+                self.expect_value = True
+                pos = self._skip_space(pos + 1)
+                continue
+
+            if char in "[{":
+                if self._container_end(pos) is None:
+                    self._check_incomplete(pos, final)
+                    break
+                try:
+                    value, end = self.json.raw_decode(self.buffer, pos)
+                except ValueError as e:
+                    raise ImportFormatError(f"Invalid JSON in item {self.index}: {e.msg}")
+            else:
+                try:
+                    value, end = self.json.raw_decode(self.buffer, pos)
+                except ValueError:
+                    self._check_incomplete(pos, final)
+                    break
+                if end == len(self.buffer) and not final:
+                    break  # A number at the very end may still be growing
+
+            yield self.index, value
+            self.index += 1
+            self.expect_value = not self.in_array
+            self.scanned = self.depth = 0
+            self.in_string = False
+            pos = self._skip_space(end)
+        self.buffer = self.buffer[pos:]
+        self.scanned = max(0, self.scanned - pos)
+
+    def feed(self, chunk: bytes) -> Iterator[Tuple[int, Any]]:
+        self.buffer += self.decoder.decode(chunk)
+        yield from self._values(final=False)
+
+    def close(self) -> Iterator[Tuple[int, Any]]:
+        self.buffer += self.decoder.decode(b"", final=True)
+        yield from self._values(final=True)
+        if self.in_array and not self.finished:
+            raise ImportFormatError("Unterminated JSON array")
+        if self.buffer.strip():
+            raise ImportFormatError("Unexpected data after the end of the document")
@@ -0,0 +1,80 @@
+"""
+Minimal JSON Patch (RFC 6902) support for partial recipe updates.
+Supports the add, remove, replace and test operations on plain dict/list documents.
+"""
+import copy
+from typing import Any, List, Tuple
+
+
+class JsonPatchError(ValueError):
+    """A patch operation could not be applied."""
+
+
+def _parse_pointer(path: str) -> List[str]:
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise JsonPatchError(f"Invalid path: {path}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in path[1:].split("/")]
+
+
+def _list_index(container: list, token: str, allow_end: bool) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit():
+        raise JsonPatchError(f"Invalid list index: {token}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"List index out of range: {token}")
+    return index
+
+
+def _resolve_parent(document: Any, path: str) -> Tuple[Any, str]:
+    tokens = _parse_pointer(path)
+    if not tokens:
+        raise JsonPatchError("Patching the whole document is not supported")
+    target = document
+    for token in tokens[:-1]:
+        if isinstance(target, dict) and token in target:
+            target = target[token]
+        elif isinstance(target, list):
+            target = target[_list_index(target, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"Path not found: {path}")
+    return target, tokens[-1]
+
+
+def apply_patch(document: Any, operations: List[dict]) -> Any:
+    """Apply operations to a copy of document and return the patched copy."""
+    document = copy.deepcopy(document)
+    for operation in operations:
+        op = operation.get("op")
+        path = operation.get("path")
+        if not isinstance(path, str):
+            raise JsonPatchError("Every operation needs a path")
+        parent, key = _resolve_parent(document, path)
+        if not isinstance(parent, (dict, list)):
+            # Paths cannot go into strings, numbers or null
+            raise JsonPatchError(f"Path not found: {path}")
+
+        if op == "add":
+            if isinstance(parent, list):
+                parent.insert(_list_index(parent, key, allow_end=True), operation.get("value"))
+            else:
+                parent[key] = operation.get("value")
+        elif op in ("remove", "replace", "test"):
+            if isinstance(parent, list):
+                index = _list_index(parent, key, allow_end=False)
+            elif key in parent:
+                index = key
+            else:
+                raise JsonPatchError(f"Path not found: {path}")
+            if op == "remove":
+                del parent[index]
+            elif op == "replace":
+                parent[index] = operation.get("value")
+            elif parent[index] != operation.get("value"):
+                raise JsonPatchError(f"Test failed at {path}")
+        else:
+            raise JsonPatchError(f"Unsupported operation: {op}")
+    return document
@@ -1,6 +1,8 @@
+import asyncio
+from contextlib import asynccontextmanager
+from anyio import to_thread
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
@@ -11,7 +13,12 @@ from .config import settings
 from .database import engine, Base, SessionLocal
 from .models import User
 from .auth import get_password_hash
-from .user_database import create_user_database
+from .user_database import (
+    create_user_database, get_user_engine_stats, get_user_write_stats, UserDatabaseBusy
+)
+from .image_jobs import shutdown_image_jobs
+from .upload_files import UploadFiles, get_upload_serving_stats
+from .upload_gc import get_upload_gc_stats, run_periodic_sweeps
 from .routers import auth, users, recipes, folders
 
 # Create database tables
@@ -84,16 +91,37 @@ create_initial_admin()
 # Rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync routes and dependencies (all database work) run in anyio's threadpool
+    to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+    sweeps = None
+    if settings.UPLOAD_GC_INTERVAL_HOURS > 0:
+        sweeps = asyncio.create_task(run_periodic_sweeps(settings.UPLOAD_GC_INTERVAL_HOURS))
+    yield
+    if sweeps is not None:
+        sweeps.cancel()
+    shutdown_image_jobs()
+
 app = FastAPI(
     title=settings.APP_NAME,
     description="A modern recipe management API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Rate limiting
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+@app.exception_handler(UserDatabaseBusy)
+async def user_database_busy_handler(request: Request, exc: UserDatabaseBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Your recipes are being updated elsewhere, please try again"},
+        headers={"Retry-After": "1"}
+    )
+
 # CORS - parse comma-separated origins from environment variable
 cors_origins = [origin.strip() for origin in settings.CORS_ORIGINS.split(",") if origin.strip()]
 app.add_middleware(
@@ -114,9 +142,9 @@ async def add_security_headers(request: Request, call_next):
     response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
     return response
 
-# Mount static files for uploads
+# Mount static files for uploads (content-named images are cached as immutable)
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
+app.mount("/uploads", UploadFiles(directory=settings.UPLOAD_DIR), name="uploads")
 
 # Include routers
 app.include_router(auth.router)
@@ -130,4 +158,10 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "user_engines": get_user_engine_stats(),
+        "user_writes": get_user_write_stats(),
+        "uploads": get_upload_serving_stats(),
+        "upload_gc": get_upload_gc_stats()
+    }
@@ -10,7 +10,8 @@ from ..schemas import (
 )
 from ..auth import (
     create_access_token, create_refresh_token, verify_token, get_current_user,
-    verify_password, get_password_hash, get_current_admin
+    verify_password, get_password_hash, password_needs_rehash, get_current_admin,
+    invalidate_user_cache
 )
 from ..user_database import create_user_database, delete_user_database
 
@@ -18,7 +19,7 @@ router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
 
 @router.post("/login", response_model=Token)
-async def login(data: UserLogin, db: Session = Depends(get_db)):
+def login(data: UserLogin, db: Session = Depends(get_db)):
     """Login with email and password."""
     user = db.query(User).filter(User.email == data.email).first()
     
@@ -40,13 +41,19 @@ async def login(data: UserLogin, db: Session = Depends(get_db)):
             detail="User account is disabled"
         )
     
+    # Upgrade hashes made with an older format or iteration count
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = get_password_hash(data.password)
+        db.commit()
+        invalidate_user_cache(user.id)
+    
     access_token = create_access_token(data={"sub": str(user.id)})
     refresh_token = create_refresh_token(data={"sub": str(user.id)})
     
     return Token(access_token=access_token, refresh_token=refresh_token)
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(token_data: TokenRefresh, db: Session = Depends(get_db)):
+def refresh_token(token_data: TokenRefresh, db: Session = Depends(get_db)):
     payload = verify_token(token_data.refresh_token, "refresh")
     
     if payload is None:
@@ -76,7 +83,7 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 
 # Admin endpoints for user management
 @router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def create_user(
+def create_user(
     user_data: AdminUserCreate,
     current_admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
@@ -114,7 +121,7 @@ async def create_user(
 
 
 @router.get("/users", response_model=List[UserResponse])
-async def list_users(
+def list_users(
     current_admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
@@ -124,7 +131,7 @@ async def list_users(
 
 
 @router.delete("/users/{user_id}", response_model=MessageResponse)
-async def delete_user(
+def delete_user(
     user_id: int,
     current_admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
@@ -151,12 +158,13 @@ async def delete_user(
     # Delete user from central database
     db.delete(user)
     db.commit()
+    invalidate_user_cache(user_id)
     
     return MessageResponse(message=f"User {user.username} deleted successfully")
 
 
 @router.put("/users/{user_id}/toggle-active", response_model=UserResponse)
-async def toggle_user_active(
+def toggle_user_active(
     user_id: int,
     current_admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
@@ -180,5 +188,6 @@ async def toggle_user_active(
     user.is_active = not user.is_active
     db.commit()
     db.refresh(user)
+    invalidate_user_cache(user.id)
     
     return user
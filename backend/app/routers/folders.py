@@ -1,36 +1,67 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import func
+from collections import defaultdict
+from typing import Dict, List, Optional
 
 from ..models import User
-from ..user_database import Folder
+from ..user_database import Folder, recipe_folder_association, folder_subtree
 from ..schemas import FolderCreate, FolderUpdate, FolderResponse, FolderTreeResponse, MessageResponse
-from ..auth import get_current_user, get_current_user_db
+from ..auth import get_current_user, get_current_user_db, get_current_user_write_db
 
 router = APIRouter(prefix="/api/folders", tags=["Folders"])
 
-def build_folder_tree(folders: List[Folder], parent_id=None) -> List[FolderTreeResponse]:
-    tree = []
+def get_recipe_counts(db: Session, folder_ids: Optional[List[int]] = None) -> Dict[int, int]:
+    """Count recipes per folder with a single GROUP BY over the association table."""
+    folder_id = recipe_folder_association.c.folder_id
+    query = db.query(folder_id, func.count()).group_by(folder_id)
+    if folder_ids is not None:
+        query = query.filter(folder_id.in_(folder_ids))
+    return dict(query.all())
+
+def build_folder_tree(folders: List[Folder], recipe_counts: Dict[int, int]) -> List[FolderTreeResponse]:
+    """
+    Build the folder tree in one pass from a parent -> children map.
+    
+    total_recipe_count adds up recipe_count over the folder and its descendants,
+    so a recipe filed in several folders of one subtree is counted once per folder.
+    """
+    children_by_parent = defaultdict(list)
     for folder in folders:
-        if folder.parent_id == parent_id:
-            children = build_folder_tree(folders, folder.id)
-            tree.append(FolderTreeResponse(
+        children_by_parent[folder.parent_id].append(folder)
+    
+    visited = set()
+    
+    def build(parent_id) -> List[FolderTreeResponse]:
+        nodes = []
+        for folder in children_by_parent[parent_id]:
+            # Guard against parent cycles left by older versions of update_folder
+            if folder.id in visited:
+                continue
+            visited.add(folder.id)
+            children = build(folder.id)
+            recipe_count = recipe_counts.get(folder.id, 0)
+            nodes.append(FolderTreeResponse(
                 id=folder.id,
                 name=folder.name,
                 description=folder.description,
                 parent_id=folder.parent_id,
                 created_at=folder.created_at,
-                recipe_count=len(folder.recipes),
+                recipe_count=recipe_count,
+                total_recipe_count=recipe_count + sum(child.total_recipe_count for child in children),
                 children=children
             ))
-    return tree
+        return nodes
+    
+    return build(None)
 
 @router.get("", response_model=List[FolderResponse])
-async def get_folders(
+def get_folders(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_current_user_db)
 ):
     folders = db.query(Folder).all()
+    recipe_counts = get_recipe_counts(db)
     
     return [FolderResponse(
         id=f.id,
@@ -38,19 +69,19 @@ async def get_folders(
         description=f.description,
         parent_id=f.parent_id,
         created_at=f.created_at,
-        recipe_count=len(f.recipes)
+        recipe_count=recipe_counts.get(f.id, 0)
     ) for f in folders]
 
 @router.get("/tree", response_model=List[FolderTreeResponse])
-async def get_folder_tree(
+def get_folder_tree(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_current_user_db)
 ):
     folders = db.query(Folder).all()
-    return build_folder_tree(folders)
+    return build_folder_tree(folders, get_recipe_counts(db))
 
 @router.get("/{folder_id}", response_model=FolderResponse)
-async def get_folder(
+def get_folder(
     folder_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_current_user_db)
@@ -69,14 +100,14 @@ async def get_folder(
         description=folder.description,
         parent_id=folder.parent_id,
         created_at=folder.created_at,
-        recipe_count=len(folder.recipes)
+        recipe_count=get_recipe_counts(db, [folder.id]).get(folder.id, 0)
     )
 
 @router.post("", response_model=FolderResponse, status_code=status.HTTP_201_CREATED)
-async def create_folder(
+def create_folder(
     folder_data: FolderCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_current_user_db)
+    db: Session = Depends(get_current_user_write_db)
 ):
     # Validate parent folder if provided
     if folder_data.parent_id:
@@ -106,11 +137,11 @@ async def create_folder(
     )
 
 @router.put("/{folder_id}", response_model=FolderResponse)
-async def update_folder(
+def update_folder(
     folder_id: int,
     folder_data: FolderUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_current_user_db)
+    db: Session = Depends(get_current_user_write_db)
 ):
     folder = db.query(Folder).filter(Folder.id == folder_id).first()
     
@@ -138,6 +169,12 @@ async def update_folder(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Parent folder not found"
                 )
+            subtree = folder_subtree(folder_id)
+            if db.query(subtree.c.id).filter(subtree.c.id == folder_data.parent_id).first():
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Folder cannot be moved into one of its subfolders"
+                )
         folder.parent_id = folder_data.parent_id if folder_data.parent_id != 0 else None
     
     db.commit()
@@ -149,14 +186,14 @@ async def update_folder(
         description=folder.description,
         parent_id=folder.parent_id,
         created_at=folder.created_at,
-        recipe_count=len(folder.recipes)
+        recipe_count=get_recipe_counts(db, [folder.id]).get(folder.id, 0)
     )
 
 @router.delete("/{folder_id}", response_model=MessageResponse)
-async def delete_folder(
+def delete_folder(
     folder_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_current_user_db)
+    db: Session = Depends(get_current_user_write_db)
 ):
     folder = db.query(Folder).filter(Folder.id == folder_id).first()
     
@@ -1,62 +1,157 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, status, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
-from typing import Optional, List
+from sqlalchemy import String, and_, false, or_, func, insert, literal, select, type_coerce
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Any, Optional, List, Set, Dict, Tuple, Union
+import base64
+import json
 import os
-import uuid
-from PIL import Image
 
 from ..models import User
-from ..user_database import Recipe, Ingredient, Instruction, Folder, Tag, Favorite
+from ..user_database import (
+    Recipe, Ingredient, Instruction, Folder, Tag, Favorite, ImageBlob,
+    recipe_folder_association, recipe_tag_association, folder_subtree,
+    get_user_session_factory, get_user_upload_dir, user_write_session_async, UserDatabaseBusy
+)
 from ..schemas import (
     RecipeCreate, RecipeUpdate, RecipeResponse, RecipeListResponse,
-    PaginatedResponse, MessageResponse
+    PaginatedResponse, CursorPaginatedResponse, MessageResponse,
+    RecipeFacetsResponse, FacetCount, FolderFacetCount,
+    BulkRecipeResult, BulkRecipeResponse, RecipeImportIssue, RecipeImportResponse
 )
 from ..config import settings
-from ..auth import get_current_user, get_current_user_db, get_current_user_upload_dir
+from ..json_patch import apply_patch, JsonPatchError
+from ..export import stream_ndjson, stream_ingredients_csv, stream_zip
+from ..importer import ImportFormatError, JsonReader, NdjsonReader, extract_recipes
+from ..image_jobs import get_incoming_dir, submit_image_job
+from ..uploads import IMAGE_UPLOAD_OPENAPI, StagedUpload, stage_image_upload
+from ..image_store import IMAGE_PROCESSING, attach_image, image_srcset, release_image, remove_image_files
+from ..search import (
+    recipe_search, build_match_query, match_clause, rank_column, get_snippets,
+    index_recipe, index_recipes, remove_recipe_from_index
+)
+from ..auth import get_current_user, get_current_user_db, get_current_user_write_db, get_current_user_upload_dir
 
 router = APIRouter(prefix="/api/recipes", tags=["Recipes"])
 
-def get_or_create_tag(db: Session, tag_name: str) -> Tag:
-    tag = db.query(Tag).filter(Tag.name == tag_name.lower()).first()
-    if not tag:
-        tag = Tag(name=tag_name.lower())
-        db.add(tag)
-        db.flush()
-    return tag
+def resolve_tags(db: Session, tag_names: List[str]) -> List[Tag]:
+    """
+    Get or create tags by name in two statements, whatever the number of tags:
+    one INSERT ... ON CONFLICT DO NOTHING and one SELECT ... IN.
+    """
+    names = list(dict.fromkeys(name.lower() for name in tag_names))
+    if not names:
+        return []
+    db.execute(
+        sqlite_insert(Tag).values([{"name": name} for name in names])
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    tags = {tag.name: tag for tag in db.query(Tag).filter(Tag.name.in_(names)).all()}
+    return [tags[name] for name in names]
+
+def resolve_folders(db: Session, folder_ids: List[int]) -> Tuple[List[Folder], List[int]]:
+    """Fetch folders by id in one query. Returns the folders and any unknown ids."""
+    ids = list(dict.fromkeys(folder_ids))
+    if not ids:
+        return [], []
+    folders = {folder.id: folder for folder in db.query(Folder).filter(Folder.id.in_(ids)).all()}
+    return [folders[i] for i in ids if i in folders], [i for i in ids if i not in folders]
 
 def check_favorite(db: Session, recipe_id: int) -> bool:
     return db.query(Favorite).filter(
         Favorite.recipe_id == recipe_id
     ).first() is not None
 
-@router.get("", response_model=PaginatedResponse)
-async def get_recipes(
-    page: int = Query(1, ge=1),
-    per_page: int = Query(12, ge=1, le=50),
+def get_favorite_ids(db: Session, recipe_ids: List[int]) -> Set[int]:
+    """Return which of the given recipes are favorited, using a single query."""
+    if not recipe_ids:
+        return set()
+    rows = db.query(Favorite.recipe_id).filter(Favorite.recipe_id.in_(recipe_ids)).all()
+    return {row.recipe_id for row in rows}
+
+def build_recipe_list(
+    db: Session,
+    recipes: List[Recipe],
+    snippets: Optional[Dict[int, str]] = None
+) -> List[RecipeListResponse]:
+    """
+    Convert a page of recipes into list items.
+    
+    Favorite status for the whole page is resolved in one query, so every
+    list endpoint costs the same number of queries regardless of page size.
+    """
+    favorite_ids = get_favorite_ids(db, [recipe.id for recipe in recipes])
+    snippets = snippets or {}
+    return [RecipeListResponse(
+        id=recipe.id,
+        title=recipe.title,
+        description=recipe.description,
+        image_url=recipe.image_url,
+        image_status=recipe.image_status,
+        image_srcset=image_srcset(recipe.image_url, recipe.image_variants),
+        image_placeholder=recipe.image_placeholder,
+        prep_time=recipe.prep_time,
+        cook_time=recipe.cook_time,
+        difficulty=recipe.difficulty,
+        created_at=recipe.created_at,
+        is_favorite=recipe.id in favorite_ids,
+        search_snippet=snippets.get(recipe.id)
+    ) for recipe in recipes]
+
+def encode_cursor(created_at: str, recipe_id: int) -> str:
+    """Encode a (created_at, id) keyset position as an opaque cursor."""
+    raw = json.dumps([created_at, recipe_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, recipe_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(created_at, str) or not isinstance(recipe_id, int):
+            raise ValueError
+        return created_at, recipe_id
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def build_recipe_query(
+    db: Session,
     search: Optional[str] = None,
     folder_id: Optional[int] = None,
+    include_subfolders: bool = False,
     tag: Optional[str] = None,
     difficulty: Optional[str] = None,
-    favorites_only: bool = False,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_current_user_db)
+    favorites_only: bool = False
 ):
+    """
+    Apply the recipe list filters to a Recipe query.
+    Returns the query and the full-text MATCH expression, if searching.
+    """
     query = db.query(Recipe)
     
-    # Search filter
-    if search:
-        search_term = f"%{search}%"
-        query = query.outerjoin(Recipe.ingredients).filter(
-            or_(
-                Recipe.title.ilike(search_term),
-                Recipe.description.ilike(search_term),
-                Ingredient.name.ilike(search_term)
-            )
-        ).distinct()
+    # Full-text search filter; a search with no words (e.g. "!!!") matches nothing
+    match = build_match_query(search) if search else None
+    if match:
+        query = query.join(recipe_search, recipe_search.c.rowid == Recipe.id).filter(match_clause(match))
+    elif search:
+        query = query.filter(false())
     
     # Folder filter
-    if folder_id:
+    if folder_id and include_subfolders:
+        subtree = folder_subtree(folder_id)
+        query = query.filter(Recipe.id.in_(
+            select(recipe_folder_association.c.recipe_id).where(
+                recipe_folder_association.c.folder_id.in_(select(subtree.c.id))
+            )
+        ))
+    elif folder_id:
         query = query.join(Recipe.folders).filter(Folder.id == folder_id)
     
     # Tag filter
@@ -71,63 +166,189 @@ async def get_recipes(
     if favorites_only:
         query = query.join(Recipe.favorites)
     
+    return query, match
+
+@router.get("", response_model=Union[PaginatedResponse, CursorPaginatedResponse])
+def get_recipes(
+    page: int = Query(1, ge=1),
+    per_page: int = Query(12, ge=1, le=50),
+    cursor: Optional[str] = Query(None, description="Opaque cursor; pass an empty value for the first page to enable cursor mode"),
+    include_total: bool = Query(False, description="Also count all matches in cursor mode"),
+    search: Optional[str] = None,
+    folder_id: Optional[int] = None,
+    include_subfolders: bool = Query(False, description="With folder_id, also include recipes in its subfolders"),
+    tag: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    favorites_only: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_current_user_db)
+):
+    query, match = build_recipe_query(
+        db, search, folder_id, include_subfolders, tag, difficulty, favorites_only
+    )
+    order_by = [Recipe.created_at.desc()]
+    if match:
+        order_by.insert(0, rank_column())
+    
+    if cursor is not None:
+        return get_recipes_after_cursor(db, query, match, cursor, per_page, include_total)
+    
     # Get total count
     total = query.count()
     
     # Pagination
     offset = (page - 1) * per_page
-    recipes = query.order_by(Recipe.created_at.desc()).offset(offset).limit(per_page).all()
-    
-    # Add favorite status
-    items = []
-    for recipe in recipes:
-        recipe_dict = {
-            "id": recipe.id,
-            "title": recipe.title,
-            "description": recipe.description,
-            "image_url": recipe.image_url,
-            "prep_time": recipe.prep_time,
-            "cook_time": recipe.cook_time,
-            "difficulty": recipe.difficulty,
-            "created_at": recipe.created_at,
-            "is_favorite": check_favorite(db, recipe.id)
-        }
-        items.append(recipe_dict)
+    recipes = query.order_by(*order_by).offset(offset).limit(per_page).all()
+    snippets = get_snippets(db, match, [recipe.id for recipe in recipes]) if match else None
     
     return PaginatedResponse(
-        items=items,
+        items=build_recipe_list(db, recipes, snippets),
         total=total,
         page=page,
         per_page=per_page,
         pages=(total + per_page - 1) // per_page
     )
 
+def get_recipes_after_cursor(
+    db: Session,
+    query,
+    match: Optional[str],
+    cursor: str,
+    per_page: int,
+    include_total: bool
+) -> CursorPaginatedResponse:
+    """
+    Keyset pagination over (created_at, id), newest first.
+    
+    Cursor mode always orders by recency (search results are not re-ranked) so
+    each page is a bounded index range scan instead of an OFFSET.
+    """
+    total = query.count() if include_total else None
+    
+    # Compare against the stored text so keys round-trip exactly
+    created_key = type_coerce(Recipe.created_at, String)
+    if cursor:
+        created_at, recipe_id = decode_cursor(cursor)
+        created_at = literal(created_at, String)
+        query = query.filter(or_(
+            created_key < created_at,
+            and_(created_key == created_at, Recipe.id < recipe_id)
+        ))
+    
+    rows = query.add_columns(created_key).order_by(
+        Recipe.created_at.desc(), Recipe.id.desc()
+    ).limit(per_page + 1).all()
+    
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last_recipe, last_created = rows[-1]
+        next_cursor = encode_cursor(last_created, last_recipe.id)
+    
+    recipes = [row[0] for row in rows]
+    snippets = get_snippets(db, match, [recipe.id for recipe in recipes]) if match else None
+    
+    return CursorPaginatedResponse(
+        items=build_recipe_list(db, recipes, snippets),
+        next_cursor=next_cursor,
+        total=total,
+        per_page=per_page
+    )
+
 @router.get("/recent", response_model=List[RecipeListResponse])
-async def get_recent_recipes(
+def get_recent_recipes(
     limit: int = Query(6, ge=1, le=20),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_current_user_db)
 ):
     recipes = db.query(Recipe).order_by(Recipe.created_at.desc()).limit(limit).all()
     
-    items = []
-    for recipe in recipes:
-        items.append(RecipeListResponse(
-            id=recipe.id,
-            title=recipe.title,
-            description=recipe.description,
-            image_url=recipe.image_url,
-            prep_time=recipe.prep_time,
-            cook_time=recipe.cook_time,
-            difficulty=recipe.difficulty,
-            created_at=recipe.created_at,
-            is_favorite=check_favorite(db, recipe.id)
-        ))
+    return build_recipe_list(db, recipes)
+
+@router.get("/facets", response_model=RecipeFacetsResponse)
+def get_recipe_facets(
+    search: Optional[str] = None,
+    folder_id: Optional[int] = None,
+    include_subfolders: bool = False,
+    tag: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    favorites_only: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_current_user_db)
+):
+    """
+    Counts per tag, difficulty, folder and favorite state for the recipes
+    matching the given filters. Each facet is one grouped query.
+    """
+    query, _ = build_recipe_query(
+        db, search, folder_id, include_subfolders, tag, difficulty, favorites_only
+    )
+    recipe_ids = query.with_entities(Recipe.id).subquery()
+    matching = Recipe.id.in_(select(recipe_ids.c.id))
+    
+    total, favorites = db.query(
+        func.count(Recipe.id), func.count(Favorite.id)
+    ).outerjoin(Recipe.favorites).filter(matching).one()
+    
+    tag_count = func.count(recipe_tag_association.c.recipe_id)
+    tags = db.query(Tag.name, tag_count).join(
+        recipe_tag_association, recipe_tag_association.c.tag_id == Tag.id
+    ).filter(
+        recipe_tag_association.c.recipe_id.in_(select(recipe_ids.c.id))
+    ).group_by(Tag.id).order_by(tag_count.desc(), Tag.name).all()
+    
+    difficulties = db.query(Recipe.difficulty, func.count(Recipe.id)).filter(
+        matching, Recipe.difficulty.isnot(None)
+    ).group_by(Recipe.difficulty).order_by(Recipe.difficulty).all()
+    
+    folder_count = func.count(recipe_folder_association.c.recipe_id)
+    folders = db.query(Folder.id, Folder.name, folder_count).join(
+        recipe_folder_association, recipe_folder_association.c.folder_id == Folder.id
+    ).filter(
+        recipe_folder_association.c.recipe_id.in_(select(recipe_ids.c.id))
+    ).group_by(Folder.id).order_by(Folder.name).all()
+    
+    return RecipeFacetsResponse(
+        total=total,
+        favorites=favorites,
+        tags=[FacetCount(value=name, count=count) for name, count in tags],
+        difficulties=[FacetCount(value=value, count=count) for value, count in difficulties],
+        folders=[FolderFacetCount(id=id, name=name, count=count) for id, name, count in folders]
+    )
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "recipes.ndjson"),
+    "csv": ("text/csv", "ingredients.csv"),
+    "zip": ("application/zip", "recipes.zip"),
+}
+
+@router.get("/export")
+def export_recipes(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|zip)$", description="ndjson (recipes), csv (ingredients) or zip (both, plus images)"),
+    current_user: User = Depends(get_current_user),
+    upload_dir: str = Depends(get_current_user_upload_dir)
+):
+    """
+    Stream the user's whole library.
+    The export opens its own session because it outlives the request's dependencies.
+    """
+    session_factory = get_user_session_factory(current_user.username)
+    if format == "ndjson":
+        body = stream_ndjson(session_factory)
+    elif format == "csv":
+        body = stream_ingredients_csv(session_factory)
+    else:
+        body = stream_zip(session_factory, upload_dir)
     
-    return items
+    media_type, filename = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{current_user.username}-{filename}"'}
+    )
 
 @router.get("/{recipe_id}", response_model=RecipeResponse)
-async def get_recipe(
+def get_recipe(
     recipe_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_current_user_db)
@@ -150,6 +371,9 @@ async def get_recipe(
         title=recipe.title,
         description=recipe.description,
         image_url=recipe.image_url,
+        image_status=recipe.image_status,
+        image_srcset=image_srcset(recipe.image_url, recipe.image_variants),
+        image_placeholder=recipe.image_placeholder,
         prep_time=recipe.prep_time,
         cook_time=recipe.cook_time,
         servings=recipe.servings,
@@ -166,10 +390,10 @@ async def get_recipe(
     return response
 
 @router.post("", response_model=RecipeResponse, status_code=status.HTTP_201_CREATED)
-async def create_recipe(
+def create_recipe(
     recipe_data: RecipeCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_current_user_db)
+    db: Session = Depends(get_current_user_write_db)
 ):
     # Create recipe
     recipe = Recipe(
@@ -205,27 +429,323 @@ async def create_recipe(
         db.add(instruction)
     
     # Add tags
-    for tag_name in recipe_data.tags:
-        tag = get_or_create_tag(db, tag_name)
-        recipe.tags.append(tag)
+    recipe.tags = resolve_tags(db, recipe_data.tags)
     
     # Add to folders
-    for folder_id in recipe_data.folder_ids:
-        folder = db.query(Folder).filter(Folder.id == folder_id).first()
-        if folder:
-            recipe.folders.append(folder)
+    recipe.folders, unknown_folder_ids = resolve_folders(db, recipe_data.folder_ids)
     
+    index_recipe(db, recipe.id)
     db.commit()
     db.refresh(recipe)
     
-    return await get_recipe(recipe.id, current_user, db)
+    response = get_recipe(recipe.id, current_user, db)
+    response.unknown_folder_ids = unknown_folder_ids
+    return response
+
+RECIPE_FIELDS = ("title", "description", "prep_time", "cook_time", "servings", "difficulty")
+INGREDIENT_FIELDS = ("name", "quantity", "unit", "notes")
+INSTRUCTION_FIELDS = ("step_number", "content", "timer_minutes")
+
+def sync_children(collection, incoming: list, model, fields) -> None:
+    """
+    Make a child collection match the incoming items with as few writes as possible.
+    
+    Items are matched to existing rows by id first, then by position among the
+    rest. Only changed columns are updated, and only surplus rows are inserted
+    or deleted (via the delete-orphan cascade).
+    """
+    existing = list(collection)
+    unmatched_by_id = {child.id: child for child in existing}
+    matches = {}
+    for position, item in enumerate(incoming):
+        if item.id is not None and item.id in unmatched_by_id:
+            matches[position] = unmatched_by_id.pop(item.id)
+    unmatched = [child for child in existing if child.id in unmatched_by_id]
+    for position in range(len(incoming)):
+        if position not in matches and unmatched:
+            matches[position] = unmatched.pop(0)
+    
+    for child in unmatched:
+        collection.remove(child)
+    for position, item in enumerate(incoming):
+        values = {field: getattr(item, field) for field in fields}
+        child = matches.get(position)
+        if child is None:
+            collection.append(model(**values))
+            continue
+        for field, value in values.items():
+            if getattr(child, field) != value:
+                setattr(child, field, value)
+
+def apply_recipe_changes(db: Session, recipe: Recipe, recipe_data, fields) -> List[int]:
+    """
+    Apply the named fields of recipe_data to a recipe, touching only what changed.
+    Returns any requested folder ids that don't exist.
+    """
+    for name in RECIPE_FIELDS:
+        if name in fields and getattr(recipe, name) != getattr(recipe_data, name):
+            setattr(recipe, name, getattr(recipe_data, name))
+    
+    if "ingredients" in fields:
+        sync_children(recipe.ingredients, recipe_data.ingredients, Ingredient, INGREDIENT_FIELDS)
+    if "instructions" in fields:
+        sync_children(recipe.instructions, recipe_data.instructions, Instruction, INSTRUCTION_FIELDS)
+    
+    # Assigning a collection only inserts/deletes the association rows that differ
+    if "tags" in fields:
+        recipe.tags = resolve_tags(db, recipe_data.tags)
+    unknown_folder_ids = []
+    if "folder_ids" in fields:
+        recipe.folders, unknown_folder_ids = resolve_folders(db, recipe_data.folder_ids)
+    return unknown_folder_ids
+
+def recipe_document(recipe: Recipe) -> dict:
+    """The editable state of a recipe, in RecipeCreate shape with child ids, for JSON Patch."""
+    return {
+        **{name: getattr(recipe, name) for name in RECIPE_FIELDS},
+        "ingredients": [
+            {"id": ing.id, **{name: getattr(ing, name) for name in INGREDIENT_FIELDS}}
+            for ing in recipe.ingredients
+        ],
+        "instructions": [
+            {"id": inst.id, **{name: getattr(inst, name) for name in INSTRUCTION_FIELDS}}
+            for inst in recipe.instructions
+        ],
+        "tags": [tag.name for tag in recipe.tags],
+        "folder_ids": [folder.id for folder in recipe.folders],
+    }
+
+def bulk_insert_recipes(db: Session, recipes: List[RecipeCreate]) -> List[Tuple[int, List[int]]]:
+    """
+    Insert many recipes with a fixed number of statements.
+    
+    Recipes, ingredients, instructions and association rows are each written
+    with one executemany-style INSERT, and tags and folders are resolved once
+    for the whole batch. Does not commit. Returns (recipe id, unknown folder ids)
+    per recipe, in order.
+    """
+    if not recipes:
+        return []
+    
+    # SQLite cannot keep RETURNING rows in parameter order for a multi-row INSERT,
+    # so allocate ids up front. The write session holds the database lock, and
+    # max(id) + 1 is what SQLite would pick for an INTEGER PRIMARY KEY anyway.
+    first_id = db.execute(select(func.coalesce(func.max(Recipe.id), 0))).scalar() + 1
+    recipe_ids = list(range(first_id, first_id + len(recipes)))
+    db.execute(insert(Recipe), [
+        {"id": recipe_id, **{name: getattr(data, name) for name in RECIPE_FIELDS}}
+        for recipe_id, data in zip(recipe_ids, recipes)
+    ])
+    
+    ingredients = [
+        {"recipe_id": recipe_id, **{name: getattr(ing, name) for name in INGREDIENT_FIELDS}}
+        for recipe_id, data in zip(recipe_ids, recipes) for ing in data.ingredients
+    ]
+    if ingredients:
+        db.execute(insert(Ingredient), ingredients)
+    
+    instructions = [
+        {"recipe_id": recipe_id, **{name: getattr(inst, name) for name in INSTRUCTION_FIELDS}}
+        for recipe_id, data in zip(recipe_ids, recipes) for inst in data.instructions
+    ]
+    if instructions:
+        db.execute(insert(Instruction), instructions)
+    
+    tags = {tag.name: tag.id for tag in resolve_tags(db, [name for data in recipes for name in data.tags])}
+    tag_rows = [
+        {"recipe_id": recipe_id, "tag_id": tags[name]}
+        for recipe_id, data in zip(recipe_ids, recipes)
+        for name in dict.fromkeys(name.lower() for name in data.tags)
+    ]
+    if tag_rows:
+        db.execute(insert(recipe_tag_association), tag_rows)
+    
+    folders, _ = resolve_folders(db, [folder_id for data in recipes for folder_id in data.folder_ids])
+    known_folder_ids = {folder.id for folder in folders}
+    folder_rows = []
+    results = []
+    for recipe_id, data in zip(recipe_ids, recipes):
+        folder_ids = list(dict.fromkeys(data.folder_ids))
+        folder_rows.extend(
+            {"recipe_id": recipe_id, "folder_id": folder_id}
+            for folder_id in folder_ids if folder_id in known_folder_ids
+        )
+        results.append((recipe_id, [folder_id for folder_id in folder_ids if folder_id not in known_folder_ids]))
+    if folder_rows:
+        db.execute(insert(recipe_folder_association), folder_rows)
+    
+    index_recipes(db, recipe_ids)
+    return results
+
+@router.post("/bulk", response_model=BulkRecipeResponse, status_code=status.HTTP_201_CREATED)
+def create_recipes_bulk(
+    items: List[Dict[str, Any]] = Body(..., description="Recipes in RecipeCreate shape"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_current_user_write_db)
+):
+    """
+    Create many recipes in one transaction.
+    Items that fail validation are reported by index and skipped; the rest are created.
+    """
+    if len(items) > settings.MAX_BULK_RECIPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many recipes. Maximum per request: {settings.MAX_BULK_RECIPES}"
+        )
+    
+    results = [BulkRecipeResult(index=index) for index in range(len(items))]
+    valid = []
+    for result, item in zip(results, items):
+        try:
+            valid.append((result, RecipeCreate.model_validate(item)))
+        except ValidationError as e:
+            result.errors = [
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            ]
+    
+    created = bulk_insert_recipes(db, [data for _, data in valid])
+    db.commit()
+    
+    for (result, _), (recipe_id, unknown_folder_ids) in zip(valid, created):
+        result.id = recipe_id
+        result.unknown_folder_ids = unknown_folder_ids
+    
+    return BulkRecipeResponse(
+        created=len(created),
+        failed=len(items) - len(created),
+        items=results
+    )
+
+# Latest import per user, shared with GET /import/status for progress polling
+_imports: Dict[str, RecipeImportResponse] = {}
+
+def insert_import_batch(db: Session, batch: List[RecipeCreate]) -> None:
+    bulk_insert_recipes(db, batch)
+    db.commit()
+
+def read_import_documents(documents) -> Tuple[List[Tuple[int, Union[RecipeCreate, str]]], int, Optional[str]]:
+    """
+    Parse, map and validate the documents from one chunk of an import body.
+    Runs in the threadpool. Returns (position, recipe or error message) per
+    recipe or bad document, the number of recipes found, and the error that
+    made the rest of the body unreadable, if any.
+    """
+    items = []
+    found = 0
+    try:
+        for position, value in documents:
+            if isinstance(value, ImportFormatError):
+                items.append((position, str(value)))
+                continue
+            for data in extract_recipes(value):
+                found += 1
+                try:
+                    items.append((position, RecipeCreate.model_validate(data)))
+                except ValidationError as e:
+                    error = e.errors()[0]
+                    items.append((position, f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"))
+    except ImportFormatError as e:
+        return items, found, str(e)
+    return items, found, None
+
+async def commit_import_batch(username: str, batch: List[RecipeCreate]) -> None:
+    """Write one import batch in its own transaction."""
+    async with user_write_session_async(username) as db:
+        await run_in_threadpool(insert_import_batch, db, batch)
+
+@router.post("/import", response_model=RecipeImportResponse)
+async def import_recipes(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Import recipes from an NDJSON or JSON (schema.org Recipe JSON-LD) request body.
+    
+    The body is parsed as it arrives and committed every IMPORT_BATCH_SIZE
+    recipes, so batches already committed survive a later failure. Send
+    Content-Type: application/x-ndjson for NDJSON; anything else is read as JSON.
+    """
+    username = current_user.username
+    if username in _imports and _imports[username].status == "running":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="An import is already running"
+        )
+    progress = _imports[username] = RecipeImportResponse()
+    
+    def report(position: int, error: str) -> None:
+        progress.failed += 1
+        if len(progress.errors) < settings.IMPORT_MAX_ERRORS:
+            progress.errors.append(RecipeImportIssue(position=position, error=error))
+    
+    async def flush(batch: List[RecipeCreate]) -> None:
+        if not batch:
+            return
+        try:
+            await commit_import_batch(username, batch)
+        except (SQLAlchemyError, UserDatabaseBusy) as e:
+            progress.batches_failed += 1
+            progress.failed += len(batch)
+            progress.error = f"Batch {progress.batches_committed + progress.batches_failed} failed: {e}"
+        else:
+            progress.batches_committed += 1
+            progress.imported += len(batch)
+    
+    content_type = request.headers.get("content-type", "")
+    ndjson = any(kind in content_type for kind in ("ndjson", "jsonl", "json-seq"))
+    reader = NdjsonReader() if ndjson else JsonReader()
+    
+    async def chunks():
+        async for chunk in request.stream():
+            progress.bytes_read += len(chunk)
+            yield reader.feed(chunk)
+        yield reader.close()
+    
+    batch: List[RecipeCreate] = []
+    try:
+        async for documents in chunks():
+            # Decoding and validation are CPU-bound; keep them off the event loop
+            items, found, fatal = await run_in_threadpool(read_import_documents, documents)
+            progress.documents += found
+            for position, item in items:
+                if isinstance(item, str):
+                    report(position, item)
+                    continue
+                batch.append(item)
+                if len(batch) >= settings.IMPORT_BATCH_SIZE:
+                    await flush(batch)
+                    batch = []
+            if fatal:
+                # Keep what was parsed before the body became unreadable
+                progress.status = "failed"
+                progress.error = fatal
+                break
+        await flush(batch)
+        if progress.status == "running":
+            progress.status = "completed"
+    finally:
+        if progress.status == "running":
+            progress.status = "failed"
+    
+    return progress
+
+@router.get("/import/status", response_model=RecipeImportResponse)
+def get_import_status(current_user: User = Depends(get_current_user)):
+    """Progress of the user's running (or most recent) import."""
+    progress = _imports.get(current_user.username)
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No import found"
+        )
+    return progress
 
 @router.put("/{recipe_id}", response_model=RecipeResponse)
-async def update_recipe(
+def update_recipe(
     recipe_id: int,
     recipe_data: RecipeUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_current_user_db)
+    db: Session = Depends(get_current_user_write_db)
 ):
     recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
     
@@ -235,71 +755,29 @@ async def update_recipe(
             detail="Recipe not found"
         )
     
-    # Update basic fields
-    if recipe_data.title is not None:
-        recipe.title = recipe_data.title
-    if recipe_data.description is not None:
-        recipe.description = recipe_data.description
-    if recipe_data.prep_time is not None:
-        recipe.prep_time = recipe_data.prep_time
-    if recipe_data.cook_time is not None:
-        recipe.cook_time = recipe_data.cook_time
-    if recipe_data.servings is not None:
-        recipe.servings = recipe_data.servings
-    if recipe_data.difficulty is not None:
-        recipe.difficulty = recipe_data.difficulty
-    
-    # Update ingredients
-    if recipe_data.ingredients is not None:
-        db.query(Ingredient).filter(Ingredient.recipe_id == recipe_id).delete()
-        for ing_data in recipe_data.ingredients:
-            ingredient = Ingredient(
-                name=ing_data.name,
-                quantity=ing_data.quantity,
-                unit=ing_data.unit,
-                notes=ing_data.notes,
-                recipe_id=recipe.id
-            )
-            db.add(ingredient)
-    
-    # Update instructions
-    if recipe_data.instructions is not None:
-        db.query(Instruction).filter(Instruction.recipe_id == recipe_id).delete()
-        for inst_data in recipe_data.instructions:
-            instruction = Instruction(
-                step_number=inst_data.step_number,
-                content=inst_data.content,
-                timer_minutes=inst_data.timer_minutes,
-                recipe_id=recipe.id
-            )
-            db.add(instruction)
-    
-    # Update tags
-    if recipe_data.tags is not None:
-        recipe.tags.clear()
-        for tag_name in recipe_data.tags:
-            tag = get_or_create_tag(db, tag_name)
-            recipe.tags.append(tag)
-    
-    # Update folders
-    if recipe_data.folder_ids is not None:
-        recipe.folders.clear()
-        for folder_id in recipe_data.folder_ids:
-            folder = db.query(Folder).filter(Folder.id == folder_id).first()
-            if folder:
-                recipe.folders.append(folder)
+    # Only fields sent (non-null) are changed
+    fields = [name for name in RecipeUpdate.model_fields if getattr(recipe_data, name) is not None]
+    unknown_folder_ids = apply_recipe_changes(db, recipe, recipe_data, fields)
     
+    index_recipe(db, recipe.id)
     db.commit()
     
-    return await get_recipe(recipe_id, current_user, db)
+    response = get_recipe(recipe_id, current_user, db)
+    response.unknown_folder_ids = unknown_folder_ids
+    return response
 
-@router.delete("/{recipe_id}", response_model=MessageResponse)
-async def delete_recipe(
+@router.patch("/{recipe_id}", response_model=RecipeResponse)
+def patch_recipe(
     recipe_id: int,
+    operations: List[Dict[str, Any]] = Body(..., description="JSON Patch (RFC 6902) operations"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_current_user_db),
-    upload_dir: str = Depends(get_current_user_upload_dir)
+    db: Session = Depends(get_current_user_write_db)
 ):
+    """
+    Partially update a recipe with JSON Patch operations, e.g.
+    {"op": "replace", "path": "/instructions/2/content", "value": "..."}.
+    Paths follow the RecipeCreate shape; ingredients and instructions include ids.
+    """
     recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
     
     if not recipe:
@@ -308,23 +786,32 @@ async def delete_recipe(
             detail="Recipe not found"
         )
     
-    # Delete image if exists
-    if recipe.image_url:
-        image_path = os.path.join(upload_dir, os.path.basename(recipe.image_url))
-        if os.path.exists(image_path):
-            os.remove(image_path)
+    try:
+        document = apply_patch(recipe_document(recipe), operations)
+    except JsonPatchError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    try:
+        recipe_data = RecipeCreate.model_validate(document)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    
+    unknown_folder_ids = apply_recipe_changes(db, recipe, recipe_data, RecipeCreate.model_fields)
     
-    db.delete(recipe)
+    index_recipe(db, recipe.id)
     db.commit()
     
-    return MessageResponse(message="Recipe deleted successfully")
+    response = get_recipe(recipe_id, current_user, db)
+    response.unknown_folder_ids = unknown_folder_ids
+    return response
 
-@router.post("/{recipe_id}/image", response_model=RecipeResponse)
-async def upload_recipe_image(
+@router.delete("/{recipe_id}", response_model=MessageResponse)
+def delete_recipe(
     recipe_id: int,
-    file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_current_user_db),
+    db: Session = Depends(get_current_user_write_db),
     upload_dir: str = Depends(get_current_user_upload_dir)
 ):
     recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
@@ -335,54 +822,87 @@ async def upload_recipe_image(
             detail="Recipe not found"
         )
     
-    # Validate file extension
-    ext = file.filename.split(".")[-1].lower()
-    if ext not in settings.ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type not allowed. Allowed types: {settings.ALLOWED_EXTENSIONS}"
-        )
+    unused = release_image(db, recipe)
+    remove_recipe_from_index(db, recipe.id)
+    db.delete(recipe)
+    db.commit()
+    
+    # Delete image files once no recipe uses them
+    remove_image_files(upload_dir, unused)
     
-    # Read and validate file size
-    contents = await file.read()
-    if len(contents) > settings.MAX_UPLOAD_SIZE:
+    return MessageResponse(message="Recipe deleted successfully")
+
+def attach_uploaded_image(db: Session, current_user: User, recipe_id: int, upload: StagedUpload) -> RecipeResponse:
+    """
+    Point a recipe at a staged upload, reusing an existing blob with the same content.
+    db must be a write session for the current user.
+    """
+    upload_dir = get_user_upload_dir(current_user.username)
+    recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
+    if not recipe:
+        os.remove(upload.path)
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE // (1024*1024)}MB"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Recipe not found"
         )
     
-    # Delete old image if exists
-    if recipe.image_url:
-        old_path = os.path.join(upload_dir, os.path.basename(recipe.image_url))
-        if os.path.exists(old_path):
-            os.remove(old_path)
-    
-    # Save new image
-    filename = f"{uuid.uuid4()}.{ext}"
-    filepath = os.path.join(upload_dir, filename)
-    
-    with open(filepath, "wb") as f:
-        f.write(contents)
-    
-    # Optionally resize image
-    try:
-        with Image.open(filepath) as img:
-            if img.width > 1200 or img.height > 1200:
-                img.thumbnail((1200, 1200), Image.Resampling.LANCZOS)
-                img.save(filepath, quality=85, optimize=True)
-    except Exception:
-        pass  # Keep original if resize fails
-    
-    recipe.image_url = f"/uploads/{current_user.username}/{filename}"
+    # Identical bytes share one stored, already processed image
+    blob = db.get(ImageBlob, upload.digest)
+    if blob is not None and blob.filename is not None:
+        os.remove(upload.path)
+        unused = attach_image(db, recipe, blob, current_user.username)
+        db.commit()
+        remove_image_files(upload_dir, unused)
+        return get_recipe(recipe_id, current_user, db)
+    
+    # New content: decoding and resizing happen in the background and the
+    # current image (if any) is replaced once the new one is ready
+    if blob is None:
+        db.add(ImageBlob(hash=upload.digest, size=upload.size, ref_count=0))
+    recipe.image_job = upload.digest
+    recipe.image_status = IMAGE_PROCESSING
     db.commit()
+    submit_image_job(current_user.username, upload.digest, f"{upload.digest}.{upload.extension}")
     
-    return await get_recipe(recipe_id, current_user, db)
+    return get_recipe(recipe_id, current_user, db)
+
+@router.post("/{recipe_id}/image", response_model=RecipeResponse, openapi_extra=IMAGE_UPLOAD_OPENAPI)
+async def upload_recipe_image(
+    recipe_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Accept a new image for a recipe as multipart field "file".
+    
+    The body is streamed to disk and rejected as soon as it passes
+    MAX_UPLOAD_SIZE. Content seen before is attached at once. Otherwise this
+    returns straight away with image_status "processing", and image_url
+    switches to the new image once it has been processed.
+    """
+    def recipe_exists() -> bool:
+        db = get_user_session_factory(current_user.username)()
+        try:
+            return db.query(Recipe.id).filter(Recipe.id == recipe_id).first() is not None
+        finally:
+            db.close()
+    
+    # Check before accepting the body, so uploads to a missing recipe are not stored
+    if not await run_in_threadpool(recipe_exists):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Recipe not found"
+        )
+    
+    upload = await stage_image_upload(request, await run_in_threadpool(get_incoming_dir, current_user.username))
+    async with user_write_session_async(current_user.username) as db:
+        return await run_in_threadpool(attach_uploaded_image, db, current_user, recipe_id, upload)
 
 @router.post("/{recipe_id}/favorite", response_model=MessageResponse)
-async def toggle_favorite(
+def toggle_favorite(
     recipe_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_current_user_db)
+    db: Session = Depends(get_current_user_write_db)
 ):
     recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
     
@@ -405,11 +925,11 @@ async def toggle_favorite(
         return MessageResponse(message="Recipe added to favorites")
 
 @router.post("/{recipe_id}/folders/{folder_id}", response_model=MessageResponse)
-async def add_recipe_to_folder(
+def add_recipe_to_folder(
     recipe_id: int,
     folder_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_current_user_db)
+    db: Session = Depends(get_current_user_write_db)
 ):
     recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
     
@@ -435,11 +955,11 @@ async def add_recipe_to_folder(
     return MessageResponse(message=f"Recipe already in {folder.name}")
 
 @router.delete("/{recipe_id}/folders/{folder_id}", response_model=MessageResponse)
-async def remove_recipe_from_folder(
+def remove_recipe_from_folder(
     recipe_id: int,
     folder_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_current_user_db)
+    db: Session = Depends(get_current_user_write_db)
 ):
     recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
     
@@ -465,10 +985,10 @@ async def remove_recipe_from_folder(
     return MessageResponse(message=f"Recipe not in {folder.name}")
 
 @router.get("/tags/all", response_model=List[str])
-async def get_all_tags(
+def get_all_tags(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_current_user_db)
 ):
-    tags = db.query(Tag).join(Tag.recipes).distinct().all()
+    tags = db.query(Tag.name).join(Tag.recipes).distinct().all()
     
     return [tag.name for tag in tags]
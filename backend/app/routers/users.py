@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models import User
 from ..schemas import UserResponse, UserUpdate, MessageResponse, PasswordChange
-from ..auth import get_current_user, get_password_hash, verify_password
+from ..auth import get_current_user, get_password_hash, verify_password, invalidate_user_cache
 from ..user_database import delete_user_database
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
@@ -14,11 +14,13 @@ async def get_profile(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.put("/profile", response_model=UserResponse)
-async def update_profile(
+def update_profile(
     user_data: UserUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    current_user = db.query(User).filter(User.id == current_user.id).first()
+    
     if user_data.email and user_data.email != current_user.email:
         if db.query(User).filter(User.email == user_data.email).first():
             raise HTTPException(
@@ -37,25 +39,27 @@ async def update_profile(
     
     db.commit()
     db.refresh(current_user)
+    invalidate_user_cache(current_user.id)
     
     return current_user
 
 @router.delete("/profile", response_model=MessageResponse)
-async def delete_account(
+def delete_account(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     # Delete user's personal database and uploads
     delete_user_database(current_user.username)
     
-    db.delete(current_user)
+    db.query(User).filter(User.id == current_user.id).delete()
     db.commit()
+    invalidate_user_cache(current_user.id)
     
     return MessageResponse(message="Account deleted successfully")
 
 
 @router.put("/password", response_model=MessageResponse)
-async def change_password(
+def change_password(
     password_data: PasswordChange,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -67,7 +71,9 @@ async def change_password(
             detail="Current password is incorrect"
         )
     
-    current_user.hashed_password = get_password_hash(password_data.new_password)
+    user = db.query(User).filter(User.id == current_user.id).first()
+    user.hashed_password = get_password_hash(password_data.new_password)
     db.commit()
+    invalidate_user_cache(user.id)
     
     return MessageResponse(message="Password changed successfully")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 # User schemas
@@ -63,7 +63,7 @@ class IngredientBase(BaseModel):
     notes: Optional[str] = Field(None, max_length=255)
 
 class IngredientCreate(IngredientBase):
-    pass
+    id: Optional[int] = None  # Existing ingredient to update; matched by position if omitted
 
 class IngredientResponse(IngredientBase):
     id: int
@@ -78,7 +78,7 @@ class InstructionBase(BaseModel):
     timer_minutes: Optional[int] = Field(None, ge=0)
 
 class InstructionCreate(InstructionBase):
-    pass
+    id: Optional[int] = None  # Existing instruction to update; matched by position if omitted
 
 class InstructionResponse(InstructionBase):
     id: int
@@ -136,6 +136,9 @@ class FolderBasicResponse(BaseModel):
 class RecipeResponse(RecipeBase):
     id: int
     image_url: Optional[str]
+    image_status: Optional[str] = None  # processing, ready or failed
+    image_srcset: Dict[str, str] = {}  # srcset per MIME type, e.g. {"image/webp": "/uploads/... 320w, ..."}
+    image_placeholder: Optional[str] = None  # data: URI of a ~20px preview
     created_at: datetime
     updated_at: Optional[datetime]
     ingredients: List[IngredientResponse]
@@ -143,6 +146,7 @@ class RecipeResponse(RecipeBase):
     tags: List[TagResponse]
     folders: List[FolderBasicResponse] = []
     is_favorite: bool = False
+    unknown_folder_ids: List[int] = []  # Requested folder ids that don't exist
     
     class Config:
         from_attributes = True
@@ -152,15 +156,64 @@ class RecipeListResponse(BaseModel):
     title: str
     description: Optional[str]
     image_url: Optional[str]
+    image_status: Optional[str] = None
+    image_srcset: Dict[str, str] = {}
+    image_placeholder: Optional[str] = None
     prep_time: Optional[int]
     cook_time: Optional[int]
     difficulty: Optional[str]
     created_at: datetime
     is_favorite: bool = False
+    search_snippet: Optional[str] = None
     
     class Config:
         from_attributes = True
 
+# Bulk creation schemas
+class BulkRecipeResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    errors: List[str] = []
+    unknown_folder_ids: List[int] = []
+
+class BulkRecipeResponse(BaseModel):
+    created: int
+    failed: int
+    items: List[BulkRecipeResult]
+
+# Import schemas
+class RecipeImportIssue(BaseModel):
+    position: int  # Line number for NDJSON, item index for JSON
+    error: str
+
+class RecipeImportResponse(BaseModel):
+    status: str = "running"  # running, completed or failed
+    bytes_read: int = 0
+    documents: int = 0
+    imported: int = 0
+    failed: int = 0
+    batches_committed: int = 0
+    batches_failed: int = 0
+    errors: List[RecipeImportIssue] = []
+    error: Optional[str] = None  # Why the import stopped early
+
+# Facet schemas
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class FolderFacetCount(BaseModel):
+    id: int
+    name: str
+    count: int
+
+class RecipeFacetsResponse(BaseModel):
+    total: int
+    favorites: int
+    tags: List[FacetCount] = []
+    difficulties: List[FacetCount] = []
+    folders: List[FolderFacetCount] = []
+
 # Folder schemas
 class FolderBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
@@ -190,6 +243,7 @@ class FolderTreeResponse(BaseModel):
     parent_id: Optional[int]
     created_at: datetime
     recipe_count: int = 0
+    total_recipe_count: int = 0
     children: List["FolderTreeResponse"] = []
     
     class Config:
@@ -203,6 +257,12 @@ class PaginatedResponse(BaseModel):
     per_page: int
     pages: int
 
+class CursorPaginatedResponse(BaseModel):
+    items: List[RecipeListResponse]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    per_page: int
+
 # Message response
 class MessageResponse(BaseModel):
     message: str
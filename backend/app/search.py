@@ -0,0 +1,137 @@
+"""
+Full-text search for per-user recipe databases.
+Each user database gets an FTS5 table (recipe_search) whose rowid is the recipe id
+and whose columns hold the searchable text of the recipe and its children.
+"""
+import html
+import re
+from typing import Dict, List, Optional
+from sqlalchemy import Table, Column, Integer, Text, MetaData, bindparam, func, inspect, literal_column, text
+from sqlalchemy.orm import Session
+
+SEARCH_TABLE = "recipe_search"
+
+# Markers wrapped around matched terms in search snippets. FTS5 inserts
+# control characters that never occur in recipe text; they become the HTML
+# markers after the text itself has been escaped.
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+_RAW_SNIPPET_START = "\x02"
+_RAW_SNIPPET_END = "\x03"
+
+# Column weights for BM25 ranking: title, description, ingredients, instructions, tags
+BM25_WEIGHTS = (10.0, 4.0, 3.0, 1.0, 5.0)
+
+# Query-only description of the FTS5 table (it is created with raw DDL, not create_all)
+recipe_search = Table(
+    SEARCH_TABLE,
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column(SEARCH_TABLE, Text),
+    Column("title", Text),
+    Column("description", Text),
+    Column("ingredients", Text),
+    Column("instructions", Text),
+    Column("tags", Text),
+)
+
+_CREATE_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+    title, description, ingredients, instructions, tags,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+# Builds one index row per recipe from the recipe and its children
+_DOCUMENT_SQL = f"""
+INSERT INTO {SEARCH_TABLE} (rowid, title, description, ingredients, instructions, tags)
+SELECT
+    r.id,
+    r.title,
+    coalesce(r.description, ''),
+    coalesce((SELECT group_concat(i.name, ' ') FROM ingredients i WHERE i.recipe_id = r.id), ''),
+    coalesce((SELECT group_concat(s.content, ' ') FROM instructions s WHERE s.recipe_id = r.id), ''),
+    coalesce((SELECT group_concat(t.name, ' ') FROM tags t
+              JOIN recipe_tag_association a ON a.tag_id = t.id
+              WHERE a.recipe_id = r.id), '')
+FROM recipes r
+"""
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_search_index(conn) -> None:
+    """Create the search table if missing, backfilling it for existing recipes."""
+    if inspect(conn).has_table(SEARCH_TABLE):
+        return
+    conn.execute(text(_CREATE_SQL))
+    conn.execute(text(_DOCUMENT_SQL))
+
+
+def rebuild_search_index(db: Session) -> None:
+    """Re-index every recipe in a user's database."""
+    db.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    db.execute(text(_DOCUMENT_SQL))
+
+
+def index_recipe(db: Session, recipe_id: int) -> None:
+    """(Re-)index a single recipe. Call after its children have been flushed."""
+    index_recipes(db, [recipe_id])
+
+
+def index_recipes(db: Session, recipe_ids: List[int]) -> None:
+    """(Re-)index several recipes with one DELETE and one INSERT ... SELECT."""
+    if not recipe_ids:
+        return
+    db.flush()
+    ids = bindparam("recipe_ids", expanding=True)
+    db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN :recipe_ids").bindparams(ids), {"recipe_ids": recipe_ids})
+    db.execute(text(_DOCUMENT_SQL + " WHERE r.id IN :recipe_ids").bindparams(ids), {"recipe_ids": recipe_ids})
+
+
+def remove_recipe_from_index(db: Session, recipe_id: int) -> None:
+    """Drop a recipe from the search index."""
+    db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :recipe_id"), {"recipe_id": recipe_id})
+
+
+def build_match_query(search: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 MATCH expression.
+    Every word must match, and the last word is treated as a prefix so
+    results update while the user is still typing.
+    """
+    tokens = _TOKEN_RE.findall(search)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def match_clause(match: str):
+    """WHERE clause restricting recipe_search to rows matching an expression."""
+    return recipe_search.c[SEARCH_TABLE].op("MATCH")(match)
+
+
+def rank_column():
+    """BM25 score of the current match (lower is more relevant)."""
+    return func.bm25(literal_column(SEARCH_TABLE), *BM25_WEIGHTS)
+
+
+def _highlight(raw: str) -> str:
+    return html.escape(raw).replace(_RAW_SNIPPET_START, SNIPPET_START).replace(_RAW_SNIPPET_END, SNIPPET_END)
+
+
+def get_snippets(db: Session, match: str, recipe_ids: List[int]) -> Dict[int, str]:
+    """
+    Return a highlighted snippet per recipe for a page of search results:
+    HTML-escaped recipe text with matches wrapped in SNIPPET_START/SNIPPET_END.
+    """
+    if not recipe_ids:
+        return {}
+    snippet = func.snippet(literal_column(SEARCH_TABLE), -1, _RAW_SNIPPET_START, _RAW_SNIPPET_END, "…", 12)
+    rows = db.query(recipe_search.c.rowid, snippet).filter(
+        match_clause(match),
+        recipe_search.c.rowid.in_(recipe_ids)
+    ).all()
+    return {row[0]: _highlight(row[1]) for row in rows}
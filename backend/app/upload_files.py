@@ -0,0 +1,95 @@
+"""
+Static serving for /uploads.
+
+Images stored by content hash (see image_store) never change under their name,
+so they are served with a year-long immutable Cache-Control and a strong ETag
+taken from the name. Conditional requests get 304s, and Range requests get 206s
+through FileResponse. Staging directories (".incoming") are never served.
+Every response is counted so /health can report bytes sent and bytes saved by
+304s and partial responses.
+"""
+import os
+import re
+import threading
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Message, Receive, Scope, Send
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# <sha256>.<ext> and its variants, <sha256>-<width>.<ext>
+CONTENT_NAME_RE = re.compile(r"^[0-9a-f]{64}(-\d+)?\.[a-z0-9]+$")
+
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "full": 0,  # 200
+    "partial": 0,  # 206
+    "not_modified": 0,  # 304
+    "bytes_sent": 0,
+    "bytes_saved": 0,  # File bytes not sent thanks to 304s and ranges
+}
+
+
+def is_content_named(filename: str) -> bool:
+    return CONTENT_NAME_RE.match(filename) is not None
+
+
+def record_response(status_code: int, file_size: int, bytes_sent: int) -> None:
+    with _stats_lock:
+        _stats["requests"] += 1
+        if status_code == 200:
+            _stats["full"] += 1
+        elif status_code == 206:
+            _stats["partial"] += 1
+        elif status_code == 304:
+            _stats["not_modified"] += 1
+        _stats["bytes_sent"] += bytes_sent
+        if status_code in (206, 304):
+            _stats["bytes_saved"] += max(0, file_size - bytes_sent)
+
+
+def get_upload_serving_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+class UploadFiles(StaticFiles):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await super().__call__(scope, receive, send)
+            return
+
+        if any(part.startswith(".") for part in scope["path"].split("/") if part):
+            raise HTTPException(status_code=404)
+
+        sent = {"status": 0, "bytes": 0}
+
+        async def counting_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                sent["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                sent["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        await super().__call__(scope, receive, counting_send)
+        if "upload_file_size" in scope:
+            record_response(sent["status"], scope["upload_file_size"], sent["bytes"])
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        scope["upload_file_size"] = stat_result.st_size
+        filename = os.path.basename(full_path)
+        headers = {}
+        if is_content_named(filename):
+            headers = {
+                "etag": f'"{os.path.splitext(filename)[0]}"',
+                "cache-control": IMMUTABLE_CACHE_CONTROL,
+            }
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
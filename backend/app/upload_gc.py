@@ -0,0 +1,212 @@
+"""
+Reclaiming upload files that no recipe references.
+
+Files can outlive their recipes when a request or image job dies between
+writing files and committing, or when deleting a user removes the database but
+not the upload directory. A sweep lists UPLOAD_DIR/<username>/ (and its
+".incoming" staging directory) and removes every file that is neither a
+recipe's image or variant nor an image blob's, reading references from the
+user's database a batch at a time. Files younger than UPLOAD_GC_GRACE_SECONDS
+are always kept, since uploads and image jobs write their files before the
+rows that reference them are committed. Removals run on a small thread pool.
+
+The app sweeps every UPLOAD_GC_INTERVAL_HOURS; manage_uploads.py gc runs one
+sweep on demand.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, Set, Tuple
+
+from anyio import to_thread
+from sqlalchemy import select, true
+
+from .config import settings
+from .database import SessionLocal
+from .image_jobs import INCOMING_DIR
+from .image_store import image_files
+from .models import User
+from .user_database import ImageBlob, Recipe, get_user_db_path, get_user_session_factory
+
+logger = logging.getLogger(__name__)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "sweeps": 0,
+    "files_removed": 0,
+    "bytes_reclaimed": 0,
+    "errors": 0,  # Users whose directory could not be swept
+    "last_sweep_at": None,
+}
+
+
+def get_upload_gc_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _iter_rows(username: str, key, columns, condition, batch_size: int) -> Iterator[tuple]:
+    """Rows of columns matching condition, a batch at a time in key order."""
+    last_key = None
+    while True:
+        query = select(key, *columns).where(condition).order_by(key).limit(batch_size)
+        if last_key is not None:
+            query = query.where(key > last_key)
+        db = get_user_session_factory(username)()
+        try:
+            rows = db.execute(query).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        yield from rows
+        last_key = rows[-1][0]
+
+
+def referenced_files(username: str, batch_size: int) -> Tuple[Set[str], Set[str]]:
+    """
+    Names a user's database still needs: (in the upload directory, in .incoming).
+    Staged uploads are needed while their blob waits for processing.
+    """
+    names: Set[str] = set()
+    for _, image_url, image_variants in _iter_rows(
+        username, Recipe.id, (Recipe.image_url, Recipe.image_variants), Recipe.image_url.isnot(None), batch_size
+    ):
+        names.update(image_files(image_url, image_variants))
+
+    staged: Set[str] = set()
+    for digest, filename, variants in _iter_rows(
+        username, ImageBlob.hash, (ImageBlob.filename, ImageBlob.variants), true(), batch_size
+    ):
+        if filename is None:
+            staged.add(digest)
+        else:
+            names.update(image_files(filename, variants))
+    return names, staged
+
+
+def _user_exists(username: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(User.id).filter(User.username == username).first() is not None
+    finally:
+        db.close()
+
+
+def _remove_if_stale(path: str, cutoff: float, dry_run: bool) -> Optional[int]:
+    """Size of the removed file, or None if it is too recent (or already gone)."""
+    try:
+        stat = os.lstat(path)
+        if stat.st_mtime > cutoff:
+            return None
+        if not dry_run:
+            os.remove(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size
+
+
+def _unreferenced(directory: str, keep: Set[str]) -> Iterator[str]:
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and entry.name not in keep:
+                yield entry.path
+
+
+def sweep_user_uploads(username: str, pool: ThreadPoolExecutor, grace_seconds: Optional[int] = None,
+                       batch_size: int = 500, dry_run: bool = False) -> dict:
+    """
+    Remove one user's unreferenced upload files older than the grace period.
+    A directory whose user no longer exists is emptied and removed; one whose
+    database is merely missing is left alone.
+    """
+    if grace_seconds is None:
+        grace_seconds = settings.UPLOAD_GC_GRACE_SECONDS
+    counts = {"unreferenced": 0, "removed": 0, "kept_recent": 0, "bytes_reclaimed": 0}
+    upload_dir = os.path.join(settings.UPLOAD_DIR, username)
+    incoming_dir = os.path.join(upload_dir, INCOMING_DIR)
+    if os.path.exists(get_user_db_path(username)):
+        names, staged = referenced_files(username, batch_size)
+        deleted_user = False
+    elif not _user_exists(username):
+        names, staged = set(), set()
+        deleted_user = True
+    else:
+        return counts
+
+    # Listed after reading references, so anything written meanwhile is recent
+    cutoff = time.time() - grace_seconds
+    candidates = list(_unreferenced(upload_dir, names))
+    if os.path.isdir(incoming_dir):
+        candidates += _unreferenced(incoming_dir, staged)
+    for size in pool.map(lambda path: _remove_if_stale(path, cutoff, dry_run), candidates):
+        counts["unreferenced"] += 1
+        if size is None:
+            counts["kept_recent"] += 1
+        else:
+            counts["removed"] += 1
+            counts["bytes_reclaimed"] += size
+
+    if deleted_user and not dry_run:
+        for directory in (incoming_dir, upload_dir):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass  # Missing, or still holds recent files
+
+    if not dry_run:
+        with _stats_lock:
+            _stats["files_removed"] += counts["removed"]
+            _stats["bytes_reclaimed"] += counts["bytes_reclaimed"]
+    return counts
+
+
+def iter_upload_usernames() -> Iterator[str]:
+    if not os.path.isdir(settings.UPLOAD_DIR):
+        return
+    for name in sorted(os.listdir(settings.UPLOAD_DIR)):
+        if not name.startswith(".") and os.path.isdir(os.path.join(settings.UPLOAD_DIR, name)):
+            yield name
+
+
+def sweep_all_uploads(grace_seconds: Optional[int] = None, batch_size: int = 500,
+                      workers: Optional[int] = None, dry_run: bool = False) -> dict:
+    """
+    Sweep every user's upload directory. Returns per-user counts, or
+    {"error": message} for a user whose sweep failed; the others still run.
+    """
+    results = {}
+    errors = 0
+    with ThreadPoolExecutor(max_workers=workers or settings.UPLOAD_GC_WORKERS, thread_name_prefix="upload-gc") as pool:
+        for username in iter_upload_usernames():
+            try:
+                results[username] = sweep_user_uploads(username, pool, grace_seconds, batch_size, dry_run)
+            except Exception as e:
+                logger.exception("Sweeping uploads for %s failed", username)
+                results[username] = {"error": str(e)}
+                errors += 1
+    if not dry_run:
+        with _stats_lock:
+            _stats["sweeps"] += 1
+            _stats["errors"] += errors
+            _stats["last_sweep_at"] = time.time()
+    return results
+
+
+async def run_periodic_sweeps(interval_hours: int) -> None:
+    """Sweep all uploads every interval_hours until cancelled."""
+    while True:
+        await asyncio.sleep(interval_hours * 3600)
+        try:
+            results = await to_thread.run_sync(sweep_all_uploads)
+        except Exception:
+            logger.exception("Upload sweep failed")
+            continue
+        swept = [counts for counts in results.values() if "error" not in counts]
+        removed = sum(counts["removed"] for counts in swept)
+        reclaimed = sum(counts["bytes_reclaimed"] for counts in swept)
+        logger.info("Upload sweep removed %d files (%d bytes); %d users failed",
+                    removed, reclaimed, len(results) - len(swept))
@@ -0,0 +1,201 @@
+"""
+Streaming ingestion of multipart image uploads.
+
+The request body is parsed as it arrives rather than through UploadFile (which
+spools the whole body before the handler runs). The image part is written in
+chunks to a temporary file with aiofiles while it is hashed and counted, and the
+upload is rejected as soon as it passes MAX_UPLOAD_SIZE. The image type comes
+from the file's leading bytes, not its name. A complete upload is renamed
+atomically to <incoming dir>/<sha256>, ready for image_jobs.
+"""
+import hashlib
+import os
+import uuid
+from typing import List, NamedTuple, Optional
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, Request, status
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from .config import settings
+
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 16 * 1024
+
+# Enough leading bytes to recognise every supported format
+SNIFF_SIZE = 12
+
+# OpenAPI description of the request body, since it is not declared as a File parameter
+IMAGE_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+class StagedUpload(NamedTuple):
+    path: str
+    digest: str  # SHA-256 of the file, hex
+    size: int
+    extension: str  # From the sniffed content, e.g. "jpg"
+
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """File extension for an image's leading bytes, or None if it is not a supported image."""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _allowed_extensions() -> set:
+    # "jpg" covers uploads configured as "jpeg"
+    allowed = set(settings.ALLOWED_EXTENSIONS)
+    if "jpeg" in allowed:
+        allowed.add("jpg")
+    return allowed
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE // (1024*1024)}MB"
+    )
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def _not_an_image() -> HTTPException:
+    return _bad_request(f"File is not a supported image. Allowed types: {settings.ALLOWED_EXTENSIONS}")
+
+
+class _ImagePartReader:
+    """MultipartParser callbacks that collect the data of one file field."""
+
+    def __init__(self, field_name: str):
+        self.field_name = field_name
+        self.chunks: List[bytes] = []
+        self.in_field = False
+        self.found = False
+        self.finished = False
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self) -> None:
+        self._disposition = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        self.in_field = (
+            not self.found
+            and options.get(b"name", b"").decode("latin-1") == self.field_name
+            and b"filename" in options
+        )
+        self.found = self.found or self.in_field
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self.in_field:
+            self.chunks.append(data[start:end])
+
+    def on_part_end(self) -> None:
+        if self.in_field:
+            self.in_field = False
+            self.finished = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def stage_image_upload(request: Request, incoming_dir: str, field_name: str = "file") -> StagedUpload:
+    """Stream the image in field_name of a multipart request into incoming_dir."""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
+        raise _too_large()
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise _bad_request("Expected a multipart/form-data upload")
+
+    reader = _ImagePartReader(field_name)
+    parser = MultipartParser(params[b"boundary"], reader.callbacks())
+    partial = os.path.join(incoming_dir, f"{uuid.uuid4()}.partial")
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+    header = b""
+    try:
+        async with aiofiles.open(partial, "wb") as f:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                data = reader.take()
+                if data:
+                    size += len(data)
+                    if size > settings.MAX_UPLOAD_SIZE:
+                        raise _too_large()
+                    if extension is None:
+                        header += data[:SNIFF_SIZE]
+                        if len(header) >= SNIFF_SIZE or reader.finished:
+                            extension = sniff_image_type(header)
+                            if extension is None or extension not in _allowed_extensions():
+                                raise _not_an_image()
+                    digest.update(data)
+                    await f.write(data)
+                if reader.finished:
+                    break
+
+        if not reader.finished:
+            raise _bad_request(f"Missing file field '{field_name}'")
+        if extension is None:
+            raise _bad_request("File is empty") if size == 0 else _not_an_image()
+
+        path = os.path.join(incoming_dir, digest.hexdigest())
+        await aiofiles.os.replace(partial, path)
+    except BaseException:
+        if await aiofiles.os.path.exists(partial):
+            await aiofiles.os.remove(partial)
+        raise
+
+    return StagedUpload(path=path, digest=digest.hexdigest(), size=size, extension=extension)
@@ -3,11 +3,23 @@ Per-user database management.
 Each user gets their own SQLite database for storing recipes, folders, etc.
 """
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, Float
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+import anyio
+from anyio import to_thread
+from sqlalchemy import create_engine, inspect, select, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, Float, Index
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
 from .config import settings
+from .database import apply_sqlite_profile
+from .search import ensure_search_index
 
 # Base for per-user databases (recipes, folders, etc.)
 UserDataBase = declarative_base()
@@ -20,15 +32,17 @@ os.makedirs(USER_DATA_DIR, exist_ok=True)
 recipe_folder_association = Table(
     'recipe_folder_association',
     UserDataBase.metadata,
-    Column('recipe_id', Integer, ForeignKey('recipes.id', ondelete='CASCADE')),
-    Column('folder_id', Integer, ForeignKey('folders.id', ondelete='CASCADE'))
+    Column('recipe_id', Integer, ForeignKey('recipes.id', ondelete='CASCADE'), primary_key=True),
+    Column('folder_id', Integer, ForeignKey('folders.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_recipe_folder_association_folder_id', 'folder_id', 'recipe_id')
 )
 
 recipe_tag_association = Table(
     'recipe_tag_association',
     UserDataBase.metadata,
-    Column('recipe_id', Integer, ForeignKey('recipes.id', ondelete='CASCADE')),
-    Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE'))
+    Column('recipe_id', Integer, ForeignKey('recipes.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_recipe_tag_association_tag_id', 'tag_id', 'recipe_id')
 )
 
 
@@ -39,6 +53,11 @@ class Recipe(UserDataBase):
     title = Column(String(255), nullable=False, index=True)
     description = Column(Text)
     image_url = Column(String(500))
+    image_status = Column(String(20))  # processing, ready or failed; None if never uploaded
+    image_job = Column(String(64))  # Content hash of the upload being processed, if any
+    image_variants = Column(Text)  # JSON {mime type: {width: filename}} of responsive copies
+    image_hash = Column(String(64), ForeignKey("image_blobs.hash"))  # None for images uploaded before the blob store
+    image_placeholder = Column(Text)  # Tiny base64 WebP data URI shown while the image loads
     prep_time = Column(Integer)
     cook_time = Column(Integer)
     servings = Column(Integer)
@@ -51,6 +70,14 @@ class Recipe(UserDataBase):
     folders = relationship("Folder", secondary=recipe_folder_association, back_populates="recipes")
     tags = relationship("Tag", secondary=recipe_tag_association, back_populates="recipes")
     favorites = relationship("Favorite", back_populates="recipe", cascade="all, delete-orphan")
+    # Lets the unit of work update or delete recipes before deleting the blob they leave
+    image_blob = relationship("ImageBlob")
+    
+    __table_args__ = (
+        # Newest-first listing and keyset pagination, optionally filtered by difficulty
+        Index("ix_recipes_created_at_id", "created_at", "id"),
+        Index("ix_recipes_difficulty_created_at_id", "difficulty", "created_at", "id"),
+    )
 
 
 class Ingredient(UserDataBase):
@@ -61,7 +88,7 @@ class Ingredient(UserDataBase):
     quantity = Column(Float)
     unit = Column(String(50))
     notes = Column(String(255))
-    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"))
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), index=True)
     
     recipe = relationship("Recipe", back_populates="ingredients")
 
@@ -76,6 +103,10 @@ class Instruction(UserDataBase):
     recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"))
     
     recipe = relationship("Recipe", back_populates="instructions")
+    
+    __table_args__ = (
+        Index("ix_instructions_recipe_id_step_number", "recipe_id", "step_number"),
+    )
 
 
 class Folder(UserDataBase):
@@ -84,13 +115,22 @@ class Folder(UserDataBase):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
     description = Column(Text)
-    parent_id = Column(Integer, ForeignKey("folders.id", ondelete="CASCADE"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("folders.id", ondelete="CASCADE"), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     parent = relationship("Folder", remote_side=[id], backref="children")
     recipes = relationship("Recipe", secondary=recipe_folder_association, back_populates="folders")
 
 
+def folder_subtree(folder_id: int):
+    """
+    Recursive CTE of folder_id and the ids of all its descendants.
+    UNION (not UNION ALL) keeps it finite even if the data contains a cycle.
+    """
+    subtree = select(Folder.id).where(Folder.id == folder_id).cte("folder_subtree", recursive=True)
+    return subtree.union(select(Folder.id).where(Folder.parent_id == subtree.c.id))
+
+
 class Tag(UserDataBase):
     __tablename__ = "tags"
     
@@ -104,15 +144,226 @@ class Favorite(UserDataBase):
     __tablename__ = "favorites"
     
     id = Column(Integer, primary_key=True, index=True)
-    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"))
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     recipe = relationship("Recipe", back_populates="favorites")
 
 
-# Cache for user database sessions
-_user_engines = {}
-_user_sessions = {}
+class ImageBlob(UserDataBase):
+    """
+    A processed image, stored once per distinct upload content.
+    Recipes copy filename, variants and placeholder onto their own row
+    (image_url, image_variants, image_placeholder) so listings need no join; ref_count is the number of
+    recipes pointing at the blob, and its files are deleted when it reaches zero.
+    """
+    __tablename__ = "image_blobs"
+    
+    hash = Column(String(64), primary_key=True)  # SHA-256 of the uploaded bytes
+    filename = Column(String(255))  # None while the upload is being processed
+    variants = Column(Text)
+    placeholder = Column(Text)
+    size = Column(Integer)  # Bytes uploaded
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# Schema migrations for per-user databases.
+# The applied version is stored in SQLite's user_version pragma. Every migration
+# must be idempotent, because brand new databases (created by create_all with
+# the current schema) still start at version 0 and run the whole list.
+
+def _migrate_search_index(conn):
+    ensure_search_index(conn)
+
+
+def _rebuild_association_table(conn, table: Table):
+    """
+    Recreate a legacy association table with its primary key, dropping duplicate
+    rows and rows whose recipe, folder or tag no longer exists (legacy databases
+    ran without foreign key enforcement).
+    """
+    columns = inspect(conn).get_columns(table.name)
+    if any(column["primary_key"] for column in columns):
+        return
+    legacy_name = f"{table.name}_legacy"
+    names = ", ".join(column.name for column in table.columns)
+    conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {legacy_name}")
+    table.create(bind=conn)
+    conditions = [f"{column.name} IS NOT NULL" for column in table.columns]
+    for column in table.columns:
+        for foreign_key in column.foreign_keys:
+            target = foreign_key.column
+            conditions.append(f"{column.name} IN (SELECT {target.name} FROM {target.table.name})")
+    conn.exec_driver_sql(
+        f"INSERT OR IGNORE INTO {table.name} ({names}) "
+        f"SELECT {names} FROM {legacy_name} "
+        f"WHERE {' AND '.join(conditions)}"
+    )
+    conn.exec_driver_sql(f"DROP TABLE {legacy_name}")
+
+
+def _migrate_indexes(conn):
+    for table in (recipe_folder_association, recipe_tag_association):
+        _rebuild_association_table(conn, table)
+    for table in UserDataBase.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+def _add_missing_columns(conn, table: Table, *names: str):
+    """Add a model's named columns if the table was created without them."""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name not in existing:
+            column = table.columns[name]
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+
+
+def _migrate_image_processing(conn):
+    _add_missing_columns(conn, Recipe.__table__, "image_status", "image_job")
+
+
+def _migrate_image_variants(conn):
+    _add_missing_columns(conn, Recipe.__table__, "image_variants")
+
+
+def _migrate_image_blobs(conn):
+    ImageBlob.__table__.create(bind=conn, checkfirst=True)
+    _add_missing_columns(conn, Recipe.__table__, "image_hash")
+
+
+def _migrate_image_placeholders(conn):
+    _add_missing_columns(conn, ImageBlob.__table__, "placeholder")
+    _add_missing_columns(conn, Recipe.__table__, "image_placeholder")
+
+
+USER_SCHEMA_MIGRATIONS = [
+    (1, _migrate_search_index),
+    (2, _migrate_indexes),
+    (3, _migrate_image_processing),
+    (4, _migrate_image_variants),
+    (5, _migrate_image_blobs),
+    (6, _migrate_image_placeholders),
+]
+USER_SCHEMA_VERSION = USER_SCHEMA_MIGRATIONS[-1][0]
+
+
+def get_user_schema_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate_user_database(engine):
+    """Bring a user database up to USER_SCHEMA_VERSION, one migration per transaction."""
+    UserDataBase.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        for version, migration in USER_SCHEMA_MIGRATIONS:
+            if get_user_schema_version(conn) >= version:
+                continue
+            # Take the write lock first so concurrent workers migrate one at a time
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                if get_user_schema_version(conn) < version:
+                    migration(conn)
+                    conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+
+class UserEngineCache:
+    """
+    Thread-safe LRU cache of per-user engines and session factories.
+    
+    Each open engine holds pooled SQLite file handles, so the cache is bounded:
+    least recently used engines, and any idle longer than idle_timeout seconds,
+    are evicted and disposed.
+    """
+    
+    def __init__(self, max_size: int, idle_timeout: float):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # username -> (engine, session_factory, last_used)
+        self._lock = threading.Lock()
+    
+    def get(self, username: str):
+        """Return (engine, session_factory) for a user, opening the database if needed."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                self.hits += 1
+                self._entries[username] = (entry[0], entry[1], time.monotonic())
+                self._entries.move_to_end(username)
+                # Idle engines are also dropped while the same users keep coming back
+                evicted = self._evict(keep=username)
+            else:
+                self.misses += 1
+        if entry is not None:
+            for stale in evicted:
+                stale.dispose()
+            return entry[0], entry[1]
+        
+        # Open and migrate outside the lock so one slow database doesn't block others
+        engine = _open_user_engine(username)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                # Another thread opened it first; keep theirs
+                evicted.append(engine)
+                engine, session_factory = entry[0], entry[1]
+            else:
+                self._entries[username] = (engine, session_factory, time.monotonic())
+                evicted.extend(self._evict(keep=username))
+        for stale in evicted:
+            stale.dispose()
+        return engine, session_factory
+    
+    def _evict(self, keep: str):
+        """Pop idle and over-capacity entries, oldest first. Caller holds the lock."""
+        evicted = []
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._entries:
+            username, (engine, _, last_used) = next(iter(self._entries.items()))
+            if username == keep or (len(self._entries) <= self.max_size and last_used >= cutoff):
+                break
+            del self._entries[username]
+            self.evictions += 1
+            evicted.append(engine)
+        return evicted
+    
+    def discard(self, username: str):
+        """Close and forget a user's engine."""
+        with self._lock:
+            entry = self._entries.pop(username, None)
+        if entry is not None:
+            entry[0].dispose()
+    
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for engine, _, _ in entries:
+            engine.dispose()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_engine_cache = UserEngineCache(settings.USER_ENGINE_CACHE_SIZE, settings.USER_ENGINE_IDLE_TIMEOUT)
 
 
 def get_user_db_path(username: str) -> str:
@@ -127,25 +378,157 @@ def get_user_upload_dir(username: str) -> str:
     return user_upload_dir
 
 
+def _open_user_engine(username: str):
+    db_path = get_user_db_path(username)
+    engine = apply_sqlite_profile(create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False}
+    ))
+    migrate_user_database(engine)
+    return engine
+
+
 def get_user_engine(username: str):
     """Get or create a database engine for a user."""
-    if username not in _user_engines:
-        db_path = get_user_db_path(username)
-        engine = create_engine(
-            f"sqlite:///{db_path}",
-            connect_args={"check_same_thread": False}
-        )
-        UserDataBase.metadata.create_all(bind=engine)
-        _user_engines[username] = engine
-    return _user_engines[username]
+    return _engine_cache.get(username)[0]
 
 
 def get_user_session_factory(username: str):
     """Get or create a session factory for a user."""
-    if username not in _user_sessions:
-        engine = get_user_engine(username)
-        _user_sessions[username] = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    return _user_sessions[username]
+    return _engine_cache.get(username)[1]
+
+
+def get_user_engine_stats() -> dict:
+    """Hit/miss/eviction counters for the per-user engine cache."""
+    return _engine_cache.stats()
+
+
+class UserDatabaseBusy(Exception):
+    """A user's database stayed locked through every write retry."""
+
+
+# Per-user write locks and contention counters. Requests first queue on an
+# anyio lock on the event loop, so waiting writers do not hold threadpool threads.
+_write_locks = {}
+_async_write_locks = {}
+_write_locks_guard = threading.Lock()
+_write_stats = {
+    "writes": 0,
+    "lock_wait_seconds": 0.0,
+    "max_lock_wait_seconds": 0.0,
+    "busy_retries": 0,
+    "busy_failures": 0,
+}
+
+
+def _get_write_lock(username: str) -> threading.Lock:
+    with _write_locks_guard:
+        if username not in _write_locks:
+            _write_locks[username] = threading.Lock()
+        return _write_locks[username]
+
+
+def _get_async_write_lock(username: str) -> anyio.Lock:
+    # Only touched from the event loop thread
+    if username not in _async_write_locks:
+        _async_write_locks[username] = anyio.Lock()
+    return _async_write_locks[username]
+
+
+def _is_busy_error(error: OperationalError) -> bool:
+    return "database is locked" in str(error.orig) or "database is busy" in str(error.orig)
+
+
+def _begin_immediate(db):
+    """
+    Start the session's transaction with the SQLite write lock already held.
+    Nothing has run yet, so retrying here is always safe.
+    
+    The caller holds the user's write lock meanwhile, so SQLite's busy wait is
+    shortened to fit and the attempts give up after USER_WRITE_MAX_WAIT.
+    """
+    deadline = time.monotonic() + settings.USER_WRITE_MAX_WAIT
+    for attempt in range(settings.USER_WRITE_RETRIES + 1):
+        connection = db.connection()
+        busy_timeout = connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        remaining_ms = max(int((deadline - time.monotonic()) * 1000), 0)
+        connection.exec_driver_sql(f"PRAGMA busy_timeout = {min(busy_timeout, remaining_ms)}")
+        try:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            return
+        except OperationalError as e:
+            error = e
+        finally:
+            connection.exec_driver_sql(f"PRAGMA busy_timeout = {busy_timeout}")
+        db.rollback()
+        if not _is_busy_error(error):
+            raise error
+        remaining = deadline - time.monotonic()
+        if attempt == settings.USER_WRITE_RETRIES or remaining <= 0:
+            with _write_locks_guard:
+                _write_stats["busy_failures"] += 1
+            raise UserDatabaseBusy() from error
+        with _write_locks_guard:
+            _write_stats["busy_retries"] += 1
+        time.sleep(min(random.uniform(0, settings.USER_WRITE_BACKOFF_BASE * 2 ** attempt), remaining))
+
+
+@contextmanager
+def user_write_session(username: str, started: Optional[float] = None):
+    """
+    A session for writing to a user's database.
+    
+    Writers in this process are serialized per user, and the first transaction
+    takes SQLite's write lock up front so concurrent writers from other workers
+    wait (and retry) instead of failing with "database is locked" mid-request.
+    The time spent waiting (since started, if given) is stored in
+    session.info["lock_wait"].
+    
+    This blocks the calling thread while waiting. Code running on the event
+    loop, including request handlers, should use user_write_session_async.
+    """
+    lock = _get_write_lock(username)
+    if started is None:
+        started = time.monotonic()
+    with lock:
+        db = get_user_session_factory(username)()
+        try:
+            _begin_immediate(db)
+            waited = time.monotonic() - started
+            db.info["lock_wait"] = waited
+            with _write_locks_guard:
+                _write_stats["writes"] += 1
+                _write_stats["lock_wait_seconds"] += waited
+                _write_stats["max_lock_wait_seconds"] = max(_write_stats["max_lock_wait_seconds"], waited)
+            yield db
+        finally:
+            db.close()
+
+
+@asynccontextmanager
+async def user_write_session_async(username: str):
+    """
+    user_write_session for async code: requests for the same user queue on the
+    event loop, and only the one holding the lock uses a thread to open the session.
+    Use the session from the threadpool.
+    """
+    started = time.monotonic()
+    async with _get_async_write_lock(username):
+        session = user_write_session(username, started)
+        db = await to_thread.run_sync(session.__enter__)
+        try:
+            yield db
+        except BaseException as e:
+            with anyio.CancelScope(shield=True):
+                await to_thread.run_sync(session.__exit__, type(e), e, e.__traceback__)
+            raise
+        await to_thread.run_sync(session.__exit__, None, None, None)
+
+
+def get_user_write_stats() -> dict:
+    """Write lock contention counters for all user databases."""
+    with _write_locks_guard:
+        return dict(_write_stats)
 
 
 def get_user_db(username: str):
@@ -160,8 +543,7 @@ def get_user_db(username: str):
 
 def create_user_database(username: str):
     """Create a new database for a user."""
-    engine = get_user_engine(username)
-    UserDataBase.metadata.create_all(bind=engine)
+    get_user_engine(username)
     # Also create their upload directory
     get_user_upload_dir(username)
     return True
@@ -172,11 +554,7 @@ def delete_user_database(username: str):
     import shutil
     
     # Close any open connections
-    if username in _user_engines:
-        _user_engines[username].dispose()
-        del _user_engines[username]
-    if username in _user_sessions:
-        del _user_sessions[username]
+    _engine_cache.discard(username)
     
     # Delete database file
     db_path = get_user_db_path(username)
@@ -0,0 +1,157 @@
+"""
+Latency benchmark for mixed concurrent users.
+
+One heavy user repeatedly loads a large folder tree and deep recipe pages while
+several light users browse their recent recipes. Reports latency percentiles for
+the light users' requests, which is what suffers when one slow request blocks
+the event loop.
+
+--mode blocking runs the same sync handlers and dependencies directly on the
+event loop, as they behaved when they were async def functions, so one run of
+each mode gives before and after numbers for the same code.
+
+Run from the backend directory:
+    python -m benchmarks.concurrency --light-users 8 --duration 10
+    python -m benchmarks.concurrency --light-users 8 --duration 10 --mode blocking
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+# Point the app at throwaway databases before it is imported
+_workdir = tempfile.mkdtemp(prefix="recipe-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'central.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_workdir, "uploads")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fastapi.dependencies.utils  # noqa: E402
+import fastapi.routing  # noqa: E402
+import httpx  # noqa: E402
+
+from app import user_database  # noqa: E402
+
+user_database.USER_DATA_DIR = os.path.join(_workdir, "user_data")
+os.makedirs(user_database.USER_DATA_DIR, exist_ok=True)
+
+from app.main import app  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.models import User  # noqa: E402
+from app.auth import create_access_token  # noqa: E402
+from app.search import rebuild_search_index  # noqa: E402
+from app.user_database import Recipe, Folder, Ingredient, create_user_database, get_user_session_factory  # noqa: E402
+
+
+async def run_inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+@asynccontextmanager
+async def contextmanager_inline(cm):
+    with cm as value:
+        yield value
+
+
+def use_blocking_handlers():
+    """Make FastAPI call sync endpoints and dependencies on the event loop instead of the threadpool."""
+    fastapi.routing.run_in_threadpool = run_inline
+    fastapi.dependencies.utils.run_in_threadpool = run_inline
+    fastapi.dependencies.utils.contextmanager_in_threadpool = contextmanager_inline
+
+
+def create_user(username: str, recipes: int, folders: int) -> str:
+    db = SessionLocal()
+    try:
+        user = User(email=f"{username}@bench.local", username=username, hashed_password="x$y")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        user_id = user.id
+    finally:
+        db.close()
+
+    create_user_database(username)
+    user_db = get_user_session_factory(username)()
+    try:
+        folder_objs = [Folder(name=f"Folder {i}") for i in range(folders)]
+        user_db.add_all(folder_objs)
+        user_db.flush()
+        for i, folder in enumerate(folder_objs[1:], start=1):
+            folder.parent_id = folder_objs[(i - 1) // 4].id
+        for i in range(recipes):
+            recipe = Recipe(title=f"Recipe {i}", description="Benchmark recipe", difficulty="easy")
+            recipe.ingredients = [Ingredient(name=f"Ingredient {j}") for j in range(5)]
+            if folder_objs:
+                recipe.folders = [folder_objs[i % len(folder_objs)]]
+            user_db.add(recipe)
+        rebuild_search_index(user_db)
+        user_db.commit()
+    finally:
+        user_db.close()
+
+    return create_access_token({"sub": str(user_id)})
+
+
+async def heavy_worker(client: httpx.AsyncClient, token: str, deadline: float):
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.perf_counter() < deadline:
+        await client.get("/api/folders/tree", headers=headers)
+        await client.get("/api/recipes?per_page=50&page=40", headers=headers)
+
+
+async def light_worker(client: httpx.AsyncClient, token: str, deadline: float, latencies: list):
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/api/recipes/recent", headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(args):
+    heavy_token = create_user("heavy", args.heavy_recipes, args.heavy_folders)
+    light_tokens = [create_user(f"light{i}", 20, 3) for i in range(args.light_users)]
+
+    latencies = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            deadline = time.perf_counter() + args.duration
+            await asyncio.gather(
+                *[heavy_worker(client, heavy_token, deadline) for _ in range(args.heavy_workers)],
+                *[light_worker(client, token, deadline, latencies) for token in light_tokens],
+            )
+
+    print(f"mode: {args.mode}")
+    print(f"light requests: {len(latencies)} in {args.duration}s")
+    print(f"p50: {statistics.median(latencies) * 1000:.1f} ms")
+    print(f"p95: {percentile(latencies, 95) * 1000:.1f} ms")
+    print(f"p99: {percentile(latencies, 99) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--light-users", type=int, default=8)
+    parser.add_argument("--heavy-workers", type=int, default=2)
+    parser.add_argument("--heavy-recipes", type=int, default=3000)
+    parser.add_argument("--heavy-folders", type=int, default=400)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--mode", choices=["threadpool", "blocking"], default="threadpool",
+                        help="blocking: run sync handlers on the event loop, for a baseline")
+    args = parser.parse_args()
+    if args.mode == "blocking":
+        use_blocking_handlers()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
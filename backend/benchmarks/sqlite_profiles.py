@@ -0,0 +1,113 @@
+"""
+Compare SQLite connection profiles on a per-user recipe database.
+
+One writer thread commits recipes (each with ingredients) while reader threads
+run the recipe list query. Reports write throughput and read latency for each
+profile in app.database.SQLITE_PROFILES.
+
+Run from the backend directory:
+    python -m benchmarks.sqlite_profiles --readers 4 --duration 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import SQLITE_PROFILES, apply_sqlite_profile  # noqa: E402
+from app.user_database import Recipe, Ingredient, migrate_user_database  # noqa: E402
+
+
+def writer(Session, deadline, counts):
+    i = 0
+    while time.perf_counter() < deadline:
+        db = Session()
+        try:
+            recipe = Recipe(title=f"Recipe {i}", description="Benchmark recipe")
+            recipe.ingredients = [Ingredient(name=f"Ingredient {j}") for j in range(5)]
+            db.add(recipe)
+            db.commit()
+            counts["writes"] += 1
+        except OperationalError:
+            db.rollback()
+            counts["write_errors"] += 1
+        finally:
+            db.close()
+        i += 1
+
+
+def reader(Session, deadline, latencies, counts):
+    while time.perf_counter() < deadline:
+        db = Session()
+        start = time.perf_counter()
+        try:
+            db.query(func.count(Recipe.id)).scalar()
+            db.query(Recipe).order_by(Recipe.created_at.desc()).limit(12).all()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            counts["read_errors"] += 1
+        finally:
+            db.close()
+
+
+def run_profile(profile, args):
+    workdir = tempfile.mkdtemp(prefix="recipe-sqlite-")
+    engine = apply_sqlite_profile(create_engine(
+        f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        connect_args={"check_same_thread": False}
+    ), profile)
+    migrate_user_database(engine)
+    Session = sessionmaker(bind=engine)
+
+    # Start with a populated library so reads do real work
+    db = Session()
+    db.add_all(Recipe(title=f"Seed {i}") for i in range(args.seed_recipes))
+    db.commit()
+    db.close()
+
+    latencies = []
+    counts = {"writes": 0, "write_errors": 0, "read_errors": 0}
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=writer, args=(Session, deadline, counts))]
+    threads += [
+        threading.Thread(target=reader, args=(Session, deadline, latencies, counts))
+        for _ in range(args.readers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0
+    print(
+        f"{profile:>8}: {counts['writes'] / args.duration:8.1f} commits/s  "
+        f"{len(latencies) / args.duration:8.1f} reads/s  "
+        f"read p50 {statistics.median(latencies) * 1000 if latencies else 0:6.2f} ms  "
+        f"p99 {p99 * 1000:6.2f} ms  "
+        f"errors w/r {counts['write_errors']}/{counts['read_errors']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--seed-recipes", type=int, default=5000)
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PROFILES))
+    args = parser.parse_args()
+    for profile in args.profiles:
+        run_profile(profile, args)
+
+
+if __name__ == "__main__":
+    main()
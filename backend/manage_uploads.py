@@ -0,0 +1,159 @@
+"""
+Maintenance commands for recipe images under UPLOAD_DIR/<username>/.
+Run with: python manage_uploads.py <command> [--user USERNAME]
+
+Commands:
+  variants       Write responsive variants for images uploaded before they existed
+  placeholders   Compute inline placeholders for images uploaded before they existed
+  gc             Delete upload files no recipe references (see app/upload_gc.py)
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+# Add the parent directory to the path so we can import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import select, update
+
+from app.config import settings
+from app.image_processing import generate_variants, make_placeholder
+from app.upload_gc import iter_upload_usernames, sweep_user_uploads
+from app.user_database import ImageBlob, Recipe, get_user_db_path, get_user_session_factory, user_write_session
+
+
+def iter_usernames(only=None):
+    """Users that have both an upload directory and a database."""
+    names = [only] if only else sorted(os.listdir(settings.UPLOAD_DIR))
+    for name in names:
+        if os.path.isdir(os.path.join(settings.UPLOAD_DIR, name)) and os.path.exists(get_user_db_path(name)):
+            yield name
+
+
+def iter_recipe_batches(username: str, condition, batch_size: int):
+    """(id, image_url) pairs matching condition, a batch at a time, in id order."""
+    last_id = 0
+    while True:
+        db = get_user_session_factory(username)()
+        try:
+            rows = db.execute(
+                select(Recipe.id, Recipe.image_url)
+                .where(Recipe.image_url.isnot(None), Recipe.id > last_id, condition)
+                .order_by(Recipe.id)
+                .limit(batch_size)
+            ).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def backfill(username: str, pool: ProcessPoolExecutor, batch_size: int, column: str, blob_column: str, compute) -> dict:
+    """
+    Fill Recipe.<column> for a user's recipes that have an image but no value,
+    computing compute(path) in the pool. The image's blob, if it has one, gets
+    the same value in ImageBlob.<blob_column>.
+    """
+    upload_dir = os.path.join(settings.UPLOAD_DIR, username)
+    counts = {"updated": 0, "missing": 0, "failed": 0}
+    for rows in iter_recipe_batches(username, getattr(Recipe, column).is_(None), batch_size):
+        jobs = []
+        for recipe_id, image_url in rows:
+            path = os.path.join(upload_dir, os.path.basename(image_url))
+            if not os.path.isfile(path):
+                counts["missing"] += 1
+                continue
+            jobs.append((recipe_id, image_url, pool.submit(compute, path)))
+
+        results = []
+        for recipe_id, image_url, job in jobs:
+            try:
+                results.append((recipe_id, image_url, job.result()))
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"  {username}: recipe {recipe_id}: {e}")
+
+        with user_write_session(username) as db:
+            for recipe_id, image_url, value in results:
+                # Skip recipes whose image changed while the value was being computed
+                result = db.execute(
+                    update(Recipe)
+                    .where(Recipe.id == recipe_id, Recipe.image_url == image_url)
+                    .values({column: value})
+                )
+                counts["updated"] += result.rowcount
+                db.execute(
+                    update(ImageBlob)
+                    .where(ImageBlob.filename == os.path.basename(image_url), getattr(ImageBlob, blob_column).is_(None))
+                    .values({blob_column: value})
+                )
+            db.commit()
+    return counts
+
+
+def _variants_json(path: str) -> str:
+    return json.dumps(generate_variants(path, settings.IMAGE_QUALITY, settings.IMAGE_VARIANT_WIDTHS))
+
+
+def backfill_variants(username: str, pool: ProcessPoolExecutor, batch_size: int) -> dict:
+    """Generate variants for a user's recipes that have an image but no variants."""
+    return backfill(username, pool, batch_size, "image_variants", "variants", _variants_json)
+
+
+def backfill_placeholders(username: str, pool: ProcessPoolExecutor, batch_size: int) -> dict:
+    """Compute placeholders for a user's recipes that have an image but no placeholder."""
+    compute = partial(make_placeholder, size=settings.IMAGE_PLACEHOLDER_SIZE)
+    return backfill(username, pool, batch_size, "image_placeholder", "placeholder", compute)
+
+
+COMMANDS = {
+    "variants": backfill_variants,
+    "placeholders": backfill_placeholders,
+}
+
+
+def collect_garbage(args) -> None:
+    usernames = [args.user] if args.user else iter_upload_usernames()
+    total = 0
+    with ThreadPoolExecutor(max_workers=args.workers or settings.UPLOAD_GC_WORKERS) as pool:
+        for username in usernames:
+            try:
+                counts = sweep_user_uploads(username, pool, args.grace_seconds, args.batch_size, args.dry_run)
+            except Exception as e:
+                print(f"{username}: failed: {e}")
+                continue
+            total += counts["bytes_reclaimed"]
+            print(f"{username}: {counts['removed']} removed ({counts['bytes_reclaimed']} bytes), "
+                  f"{counts['kept_recent']} too recent")
+    print(f"{'Would reclaim' if args.dry_run else 'Reclaimed'} {total} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=sorted([*COMMANDS, "gc"]))
+    parser.add_argument("--user", help="Only process this username")
+    parser.add_argument("--workers", type=int, help="Worker processes (threads for gc)")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--grace-seconds", type=int, default=settings.UPLOAD_GC_GRACE_SECONDS,
+                        help="gc: keep unreferenced files younger than this")
+    parser.add_argument("--dry-run", action="store_true", help="gc: report without deleting")
+    args = parser.parse_args()
+
+    if args.command == "gc":
+        collect_garbage(args)
+        return
+
+    with ProcessPoolExecutor(max_workers=args.workers or settings.IMAGE_WORKERS) as pool:
+        for username in iter_usernames(args.user):
+            counts = COMMANDS[args.command](username, pool, args.batch_size)
+            print(f"{username}: {counts['updated']} updated, {counts['missing']} missing, {counts['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
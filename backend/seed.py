@@ -22,6 +22,7 @@ from app.user_database import (
     get_user_session_factory,
     Recipe, Ingredient, Instruction, Folder, Tag
 )
+from app.search import rebuild_search_index
 
 
 
@@ -294,6 +295,7 @@ def seed_user_data(username: str):
             
             print(f"  Created recipe: {recipe.title}")
         
+        rebuild_search_index(user_db)
         user_db.commit()
         print(f"  ✅ User {username}'s data seeded successfully!")
         
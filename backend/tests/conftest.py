@@ -6,7 +6,10 @@ from sqlalchemy.pool import StaticPool
 
 from app.main import app
 from app.database import Base, get_db
-from app.auth import get_password_hash
+from app.auth import get_password_hash, clear_auth_cache
+from app import user_database
+from app.image_jobs import wait_for_image_jobs
+from app.config import settings
 
 # Test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -27,6 +30,23 @@ def override_get_db():
 
 app.dependency_overrides[get_db] = override_get_db
 
+@pytest.fixture(autouse=True)
+def user_data_dir(tmp_path, monkeypatch):
+    """Give every test its own per-user database and upload directories."""
+    monkeypatch.setattr(user_database, "USER_DATA_DIR", str(tmp_path / "user_data"))
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    (tmp_path / "user_data").mkdir()
+    (tmp_path / "uploads").mkdir()
+    yield tmp_path
+    wait_for_image_jobs()
+    user_database._engine_cache.clear()
+
+@pytest.fixture(autouse=True)
+def auth_cache():
+    clear_auth_cache()
+    yield
+    clear_auth_cache()
+
 @pytest.fixture(scope="function")
 def db():
     Base.metadata.create_all(bind=engine)
@@ -58,7 +78,30 @@ def test_user(db):
 def auth_headers(client, test_user):
     response = client.post(
         "/api/auth/login",
-        data={"username": "test@example.com", "password": "testpassword123"}
+        json={"email": "test@example.com", "password": "testpassword123"}
     )
     token = response.json()["access_token"]
     return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def count_user_queries(client, auth_headers):
+    """Return a function that requests a URL and counts queries against the test user's database."""
+    from sqlalchemy import event
+    from app.user_database import get_user_engine
+    
+    def count(url, method="get", **kwargs):
+        engine = get_user_engine("testuser")
+        statements = []
+        
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = client.request(method, url, headers=auth_headers, **kwargs)
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        assert response.status_code in (200, 201)
+        return len(statements), response.json()
+    
+    return count
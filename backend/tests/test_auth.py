@@ -84,3 +84,76 @@ def test_change_password(client, auth_headers):
         data={"username": "test@example.com", "password": "newpassword456"}
     )
     assert login_response.status_code == 200
+
+def test_login_rehashes_legacy_password(client, db):
+    import hashlib
+    from app.models import User
+    
+    legacy_hash = "salt$" + hashlib.pbkdf2_hmac("sha256", b"legacypass123", b"salt", 100000).hex()
+    user = User(email="legacy@example.com", username="legacy", hashed_password=legacy_hash)
+    db.add(user)
+    db.commit()
+    
+    response = client.post("/api/auth/login", json={"email": "legacy@example.com", "password": "legacypass123"})
+    assert response.status_code == 200
+    
+    db.refresh(user)
+    assert user.hashed_password.startswith("pbkdf2_sha256$100000$")
+    response = client.post("/api/auth/login", json={"email": "legacy@example.com", "password": "legacypass123"})
+    assert response.status_code == 200
+
+def test_login_returns_503_when_hashing_is_saturated(client, test_user, monkeypatch):
+    import threading
+    from app import auth
+    
+    monkeypatch.setattr(auth, "_hash_slots", threading.BoundedSemaphore(1))
+    auth._hash_slots.acquire()
+    
+    response = client.post("/api/auth/login", json={"email": "test@example.com", "password": "testpassword123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_current_user_is_cached(client, auth_headers):
+    from sqlalchemy import event
+    from tests.conftest import engine
+    
+    client.get("/api/auth/me", headers=auth_headers)
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get("/api/auth/me", headers=auth_headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    
+    assert response.status_code == 200
+    assert response.json()["email"] == "test@example.com"
+    assert statements == []
+
+def test_deactivating_user_invalidates_cache(client, db, test_user, auth_headers):
+    from app.models import User
+    from app.auth import get_password_hash
+    
+    admin = User(email="admin@example.com", username="admin", role="admin",
+                 hashed_password=get_password_hash("adminpassword123"))
+    db.add(admin)
+    db.commit()
+    admin_token = client.post(
+        "/api/auth/login", json={"email": "admin@example.com", "password": "adminpassword123"}
+    ).json()["access_token"]
+    
+    assert client.get("/api/auth/me", headers=auth_headers).status_code == 200
+    response = client.put(
+        f"/api/auth/users/{test_user.id}/toggle-active",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    assert client.get("/api/auth/me", headers=auth_headers).status_code == 403
+
+def test_profile_update_refreshes_cached_user(client, auth_headers):
+    response = client.put("/api/users/profile", json={"email": "renamed@example.com"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert client.get("/api/auth/me", headers=auth_headers).json()["email"] == "renamed@example.com"
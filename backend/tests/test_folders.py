@@ -0,0 +1,67 @@
+import pytest
+
+def create_folder(client, auth_headers, name, parent_id=None):
+    response = client.post("/api/folders", json={"name": name, "parent_id": parent_id}, headers=auth_headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+def test_folder_tree_counts(client, auth_headers):
+    dinner = create_folder(client, auth_headers, "Dinner")
+    pasta = create_folder(client, auth_headers, "Pasta", dinner)
+    client.post("/api/recipes", json={"title": "Roast", "folder_ids": [dinner]}, headers=auth_headers)
+    client.post("/api/recipes", json={"title": "Carbonara", "folder_ids": [pasta]}, headers=auth_headers)
+    client.post("/api/recipes", json={"title": "Pesto", "folder_ids": [pasta]}, headers=auth_headers)
+    
+    tree = client.get("/api/folders/tree", headers=auth_headers).json()
+    assert len(tree) == 1
+    assert tree[0]["recipe_count"] == 1
+    assert tree[0]["total_recipe_count"] == 3
+    assert tree[0]["children"][0]["name"] == "Pasta"
+    assert tree[0]["children"][0]["recipe_count"] == 2
+    
+    flat = {f["name"]: f["recipe_count"] for f in client.get("/api/folders", headers=auth_headers).json()}
+    assert flat == {"Dinner": 1, "Pasta": 2}
+    assert client.get(f"/api/folders/{pasta}", headers=auth_headers).json()["recipe_count"] == 2
+
+def test_folder_tree_query_count_is_constant(client, auth_headers, count_user_queries):
+    parent = create_folder(client, auth_headers, "Root")
+    client.post("/api/recipes", json={"title": "One", "folder_ids": [parent]}, headers=auth_headers)
+    small_count, _ = count_user_queries("/api/folders/tree")
+    
+    for i in range(20):
+        parent = create_folder(client, auth_headers, f"Nested {i}", parent)
+        client.post("/api/recipes", json={"title": f"Recipe {i}", "folder_ids": [parent]}, headers=auth_headers)
+    large_count, tree = count_user_queries("/api/folders/tree")
+    
+    assert small_count == large_count
+    assert tree[0]["total_recipe_count"] == 21
+
+def test_list_recipes_including_subfolders(client, auth_headers):
+    dinner = create_folder(client, auth_headers, "Dinner")
+    pasta = create_folder(client, auth_headers, "Pasta", dinner)
+    fresh = create_folder(client, auth_headers, "Fresh", pasta)
+    other = create_folder(client, auth_headers, "Other")
+    client.post("/api/recipes", json={"title": "Roast", "folder_ids": [dinner]}, headers=auth_headers)
+    client.post("/api/recipes", json={"title": "Tagliatelle", "folder_ids": [pasta, fresh]}, headers=auth_headers)
+    client.post("/api/recipes", json={"title": "Toast", "folder_ids": [other]}, headers=auth_headers)
+    
+    direct = client.get(f"/api/recipes?folder_id={dinner}", headers=auth_headers).json()
+    assert [item["title"] for item in direct["items"]] == ["Roast"]
+    
+    nested = client.get(f"/api/recipes?folder_id={dinner}&include_subfolders=true", headers=auth_headers).json()
+    assert nested["total"] == 2
+    assert sorted(item["title"] for item in nested["items"]) == ["Roast", "Tagliatelle"]
+
+def test_folder_cannot_move_into_descendant(client, auth_headers):
+    dinner = create_folder(client, auth_headers, "Dinner")
+    pasta = create_folder(client, auth_headers, "Pasta", dinner)
+    fresh = create_folder(client, auth_headers, "Fresh", pasta)
+    
+    response = client.put(f"/api/folders/{dinner}", json={"parent_id": fresh}, headers=auth_headers)
+    assert response.status_code == 400
+    assert "subfolders" in response.json()["detail"]
+    
+    other = create_folder(client, auth_headers, "Other")
+    response = client.put(f"/api/folders/{fresh}", json={"parent_id": other}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["parent_id"] == other
@@ -0,0 +1,145 @@
+import json
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.config import settings
+from app.importer import JsonReader, parse_duration, recipe_from_jsonld
+
+
+def chunked(data: bytes, size: int = 7):
+    """Send a request body in small pieces so documents span chunk boundaries."""
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+JSONLD_RECIPE = {
+    "@context": "https://schema.org",
+    "@type": "Recipe",
+    "name": "Pancakes &amp; Syrup",
+    "description": "<p>Fluffy weekend pancakes</p>",
+    "prepTime": "PT10M",
+    "cookTime": "PT1H5M",
+    "recipeYield": ["4", "4 servings"],
+    "recipeIngredient": ["2 cups flour", "1 egg"],
+    "recipeInstructions": [
+        {"@type": "HowToSection", "name": "Batter", "itemListElement": [
+            {"@type": "HowToStep", "text": "Mix everything."},
+            {"@type": "HowToStep", "text": "Rest for 5 minutes."}
+        ]},
+        {"@type": "HowToStep", "text": "Fry until golden."}
+    ],
+    "keywords": "breakfast, sweet",
+    "recipeCategory": "Breakfast"
+}
+
+
+@pytest.mark.parametrize("value, minutes", [
+    ("PT10M", 10), ("PT1H30M", 90), ("P1DT2H", 1560), ("PT90S", 2), ("pt2h", 120), (15, 15),
+    ("PT", None), ("10 minutes", None), (None, None)
+])
+def test_parse_duration(value, minutes):
+    assert parse_duration(value) == minutes
+
+
+def test_jsonld_text_has_no_markup():
+    data = recipe_from_jsonld({
+        "@type": "Recipe",
+        "name": "&lt;script&gt;alert(1)&lt;/script&gt; Tea &amp; Toast",
+        "recipeInstructions": ["<p>Brew &lt;b&gt;strong&lt;/b&gt;</p>"],
+    })
+    assert data["title"] == "alert(1) Tea & Toast"
+    assert data["instructions"][0]["content"] == "Brew strong"
+
+
+def test_json_reader_handles_every_chunk_boundary():
+    values = [{"title": "Br\\ace } ] \\\" [ {", "tags": [["x"], {}]}, 12345, "caf\u00e9", [], None]
+    body = ("\ufeff" + json.dumps(values, ensure_ascii=False)).encode()
+    for split in range(1, len(body)):
+        reader = JsonReader()
+        parsed = list(reader.feed(body[:split])) + list(reader.feed(body[split:])) + list(reader.close())
+        assert [value for _, value in parsed] == values, split
+
+
+def test_import_jsonld(client, auth_headers):
+    body = json.dumps([
+        JSONLD_RECIPE,
+        {"@context": "https://schema.org", "@graph": [{"@type": "WebPage"}, dict(JSONLD_RECIPE, name="Waffles")]},
+        {"@type": "Recipe", "name": ""}
+    ]).encode()
+    response = client.post(
+        "/api/recipes/import",
+        content=chunked(body),
+        headers={**auth_headers, "Content-Type": "application/ld+json"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "completed"
+    assert data["bytes_read"] == len(body)
+    assert (data["documents"], data["imported"], data["failed"]) == (3, 2, 1)
+    assert data["errors"][0]["position"] == 2
+    
+    recipes = client.get("/api/recipes?search=pancakes", headers=auth_headers).json()["items"]
+    recipe = client.get(f"/api/recipes/{recipes[0]['id']}", headers=auth_headers).json()
+    assert recipe["title"] == "Pancakes & Syrup"
+    assert recipe["description"] == "Fluffy weekend pancakes"
+    assert (recipe["prep_time"], recipe["cook_time"], recipe["servings"]) == (10, 65, 4)
+    assert [ing["name"] for ing in recipe["ingredients"]] == ["2 cups flour", "1 egg"]
+    assert [step["content"] for step in recipe["instructions"]] == [
+        "Mix everything.", "Rest for 5 minutes.", "Fry until golden."
+    ]
+    assert sorted(tag["name"] for tag in recipe["tags"]) == ["breakfast", "sweet"]
+    
+    status = client.get("/api/recipes/import/status", headers=auth_headers).json()
+    assert status["imported"] == 2
+
+
+def test_import_ndjson_round_trips_export(client, auth_headers):
+    items = [{"title": f"Soup {i}", "ingredients": [{"name": "Leek"}], "tags": ["soup"]} for i in range(3)]
+    client.post("/api/recipes/bulk", json=items, headers=auth_headers)
+    export = client.get("/api/recipes/export", headers=auth_headers).content
+    
+    body = export + b"{not json\n\n" + json.dumps(JSONLD_RECIPE).encode()
+    data = client.post(
+        "/api/recipes/import",
+        content=chunked(body),
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"}
+    ).json()
+    assert (data["imported"], data["failed"]) == (4, 1)
+    assert data["errors"][0]["position"] == 4
+    assert client.get("/api/recipes?search=leek", headers=auth_headers).json()["total"] == 6
+
+
+def test_import_keeps_committed_batches(client, auth_headers, monkeypatch):
+    from app.routers import recipes
+    
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+    insert = recipes.insert_import_batch
+    calls = []
+    
+    def flaky_insert(db, batch):
+        calls.append(len(batch))
+        if len(calls) == 2:
+            raise OperationalError("INSERT", {}, Exception("disk I/O error"))
+        insert(db, batch)
+    
+    monkeypatch.setattr(recipes, "insert_import_batch", flaky_insert)
+    body = b"\n".join(json.dumps({"title": f"Bread {i}"}).encode() for i in range(5))
+    data = client.post(
+        "/api/recipes/import",
+        content=body,
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"}
+    ).json()
+    assert calls == [2, 2, 1]
+    assert (data["batches_committed"], data["batches_failed"]) == (2, 1)
+    assert (data["imported"], data["failed"]) == (3, 2)
+    assert "Batch 2 failed" in data["error"]
+    assert client.get("/api/recipes", headers=auth_headers).json()["total"] == 3
+
+
+def test_import_stops_at_malformed_json(client, auth_headers):
+    body = b'[{"title": "Kept"}, {"title": "Broken"'
+    data = client.post("/api/recipes/import", content=body, headers=auth_headers).json()
+    assert data["status"] == "failed"
+    assert data["imported"] == 1
+    assert "item 1" in data["error"]
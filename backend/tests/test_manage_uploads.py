@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import manage_uploads
+from app.user_database import Recipe, create_user_database, get_user_session_factory
+
+
+def add_recipe(username, **fields):
+    db = get_user_session_factory(username)()
+    try:
+        recipe = Recipe(title="Legacy", **fields)
+        db.add(recipe)
+        db.commit()
+        return recipe.id
+    finally:
+        db.close()
+
+
+def test_backfill_variants(user_data_dir):
+    create_user_database("legacy")
+    upload_dir = user_data_dir / "uploads" / "legacy"
+    Image.new("RGB", (800, 400), "blue").save(upload_dir / "old.jpg")
+    with_file = add_recipe("legacy", image_url="/uploads/legacy/old.jpg")
+    add_recipe("legacy", image_url="/uploads/legacy/gone.jpg")
+    add_recipe("legacy")
+    
+    with ThreadPoolExecutor() as pool:
+        counts = manage_uploads.backfill_variants("legacy", pool, batch_size=1)
+        assert counts == {"updated": 1, "missing": 1, "failed": 0}
+        # Already backfilled recipes are skipped
+        assert manage_uploads.backfill_variants("legacy", pool, batch_size=1)["updated"] == 0
+    
+    assert list(manage_uploads.iter_usernames()) == ["legacy"]
+    db = get_user_session_factory("legacy")()
+    recipe = db.get(Recipe, with_file)
+    db.close()
+    assert "old-320.webp" in recipe.image_variants
+    assert sorted(p.name for p in upload_dir.iterdir()) == [
+        "old-320.jpg", "old-320.webp", "old-640.jpg", "old-640.webp", "old-800.webp", "old.jpg"
+    ]
+
+
+def test_backfill_placeholders(user_data_dir):
+    create_user_database("legacy")
+    upload_dir = user_data_dir / "uploads" / "legacy"
+    Image.new("RGB", (800, 400), "red").save(upload_dir / "old.png")
+    recipe_id = add_recipe("legacy", image_url="/uploads/legacy/old.png")
+
+    with ThreadPoolExecutor() as pool:
+        counts = manage_uploads.backfill_placeholders("legacy", pool, batch_size=10)
+    assert counts == {"updated": 1, "missing": 0, "failed": 0}
+
+    db = get_user_session_factory("legacy")()
+    recipe = db.get(Recipe, recipe_id)
+    db.close()
+    assert recipe.image_placeholder.startswith("data:image/webp;base64,")
@@ -1,5 +1,7 @@
 import pytest
 
+from app.image_jobs import wait_for_image_jobs
+
 def test_create_recipe(client, auth_headers):
     response = client.post(
         "/api/recipes",
@@ -128,3 +130,608 @@ def test_search_recipes(client, auth_headers):
     assert response.status_code == 200
     data = response.json()
     assert data["total"] >= 1
+
+def test_recipe_list_query_count_is_constant(client, auth_headers, count_user_queries):
+    for i in range(2):
+        client.post("/api/recipes", json={"title": f"Small {i}"}, headers=auth_headers)
+    small_count, _ = count_user_queries("/api/recipes?per_page=50")
+    small_recent, _ = count_user_queries("/api/recipes/recent?limit=20")
+    
+    for i in range(10):
+        response = client.post("/api/recipes", json={"title": f"Large {i}"}, headers=auth_headers)
+        if i % 2 == 0:
+            client.post(f"/api/recipes/{response.json()['id']}/favorite", headers=auth_headers)
+    large_count, data = count_user_queries("/api/recipes?per_page=50")
+    large_recent, _ = count_user_queries("/api/recipes/recent?limit=20")
+    
+    assert small_count == large_count
+    assert small_recent == large_recent
+    assert sum(item["is_favorite"] for item in data["items"]) == 5
+
+def test_search_ranks_and_matches_children(client, auth_headers):
+    client.post(
+        "/api/recipes",
+        json={
+            "title": "Weeknight Pasta",
+            "ingredients": [{"name": "Basil"}],
+            "instructions": [{"step_number": 1, "content": "Simmer the tomatoes"}],
+            "tags": ["italian"]
+        },
+        headers=auth_headers
+    )
+    client.post("/api/recipes", json={"title": "Basil Pesto", "description": "Fresh basil"}, headers=auth_headers)
+    client.post("/api/recipes", json={"title": "Pancakes"}, headers=auth_headers)
+    
+    data = client.get("/api/recipes?search=basil", headers=auth_headers).json()
+    assert [item["title"] for item in data["items"]] == ["Basil Pesto", "Weeknight Pasta"]
+    assert "<mark>" in data["items"][0]["search_snippet"]
+    
+    # Prefix matching, plus instruction text and tags
+    assert client.get("/api/recipes?search=simm", headers=auth_headers).json()["total"] == 1
+    assert client.get("/api/recipes?search=italian", headers=auth_headers).json()["total"] == 1
+    
+    # Snippets are escaped recipe text; only the highlight markers are markup
+    client.post("/api/recipes", json={"title": "Saffron <img src=x onerror=alert(1)>"}, headers=auth_headers)
+    snippet = client.get("/api/recipes?search=saffron", headers=auth_headers).json()["items"][0]["search_snippet"]
+    assert snippet == "<mark>Saffron</mark> &lt;img src=x onerror=alert(1)&gt;"
+    
+    # Punctuation alone has no words to match
+    assert client.get("/api/recipes?search=!!!", headers=auth_headers).json()["total"] == 0
+
+def test_search_index_follows_updates_and_deletes(client, auth_headers):
+    recipe_id = client.post("/api/recipes", json={"title": "Lemon Tart"}, headers=auth_headers).json()["id"]
+    
+    client.put(f"/api/recipes/{recipe_id}", json={"title": "Lime Tart"}, headers=auth_headers)
+    assert client.get("/api/recipes?search=lemon", headers=auth_headers).json()["total"] == 0
+    assert client.get("/api/recipes?search=lime", headers=auth_headers).json()["total"] == 1
+    
+    client.delete(f"/api/recipes/{recipe_id}", headers=auth_headers)
+    assert client.get("/api/recipes?search=lime", headers=auth_headers).json()["total"] == 0
+
+def test_search_index_backfills_existing_database(client, auth_headers):
+    from sqlalchemy import text
+    from app import user_database
+    
+    client.post("/api/recipes", json={"title": "Old Fashioned Stew"}, headers=auth_headers)
+    engine = user_database.get_user_engine("testuser")
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE recipe_search"))
+        conn.execute(text("PRAGMA user_version = 0"))
+    user_database._engine_cache.clear()
+    
+    assert client.get("/api/recipes?search=stew", headers=auth_headers).json()["total"] == 1
+
+def test_cursor_pagination(client, auth_headers):
+    created = [
+        client.post("/api/recipes", json={"title": f"Cursor {i}"}, headers=auth_headers).json()["id"]
+        for i in range(5)
+    ]
+    
+    seen = []
+    cursor = ""
+    while cursor is not None:
+        response = client.get(f"/api/recipes?per_page=2&cursor={cursor}", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] is None
+        seen.extend(item["id"] for item in data["items"])
+        cursor = data["next_cursor"]
+    
+    assert seen == sorted(created, reverse=True)
+    
+    data = client.get("/api/recipes?per_page=2&cursor=&include_total=true", headers=auth_headers).json()
+    assert data["total"] == 5
+    
+    response = client.get("/api/recipes?cursor=not-a-cursor", headers=auth_headers)
+    assert response.status_code == 400
+
+def test_write_reports_lock_wait(client, auth_headers):
+    response = client.post("/api/recipes", json={"title": "Timed"}, headers=auth_headers)
+    assert response.status_code == 201
+    assert response.headers["Server-Timing"].startswith("db-lock;dur=")
+
+def test_write_returns_503_when_database_stays_locked(client, auth_headers, monkeypatch):
+    import sqlite3
+    from app.config import settings
+    from app.database import SQLITE_PROFILES
+    from app import user_database
+    
+    monkeypatch.setitem(SQLITE_PROFILES["tuned"], "busy_timeout", 10)
+    monkeypatch.setattr(settings, "USER_WRITE_RETRIES", 2)
+    monkeypatch.setattr(settings, "USER_WRITE_BACKOFF_BASE", 0.001)
+    user_database._engine_cache.clear()
+    
+    # Another process holds the write lock for the whole request
+    user_database.get_user_engine("testuser")
+    other = sqlite3.connect(user_database.get_user_db_path("testuser"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        before = user_database.get_user_write_stats()
+        response = client.post("/api/recipes", json={"title": "Blocked"}, headers=auth_headers)
+        after = user_database.get_user_write_stats()
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    
+    assert response.status_code == 503
+    assert after["busy_retries"] - before["busy_retries"] == 2
+    assert after["busy_failures"] - before["busy_failures"] == 1
+    
+    response = client.post("/api/recipes", json={"title": "Unblocked"}, headers=auth_headers)
+    assert response.status_code == 201
+
+def test_queued_writes_do_not_exhaust_the_threadpool(client, auth_headers):
+    import anyio
+    import httpx
+    from anyio import to_thread
+    from app.main import app
+    
+    async def run():
+        # More writers than threads: waiting for the user's write lock must not hold one
+        to_thread.current_default_thread_limiter().total_tokens = 4
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=auth_headers) as http:
+            with anyio.fail_after(30):
+                responses = []
+                
+                async def post(i):
+                    responses.append(await http.post("/api/recipes", json={"title": f"Concurrent {i}"}))
+                
+                async with anyio.create_task_group() as tg:
+                    for i in range(16):
+                        tg.start_soon(post, i)
+        return responses
+    
+    responses = anyio.run(run)
+    assert [r.status_code for r in responses] == [201] * 16
+    assert client.get("/api/recipes?limit=100", headers=auth_headers).json()["total"] == 16
+
+def test_recipe_facets(client, auth_headers):
+    folder_id = client.post("/api/folders", json={"name": "Dinner"}, headers=auth_headers).json()["id"]
+    first = client.post(
+        "/api/recipes",
+        json={"title": "Chili", "difficulty": "easy", "tags": ["spicy", "beef"], "folder_ids": [folder_id]},
+        headers=auth_headers
+    ).json()["id"]
+    client.post("/api/recipes", json={"title": "Curry", "difficulty": "hard", "tags": ["spicy"]}, headers=auth_headers)
+    client.post("/api/recipes", json={"title": "Salad", "difficulty": "easy"}, headers=auth_headers)
+    client.post(f"/api/recipes/{first}/favorite", headers=auth_headers)
+    
+    data = client.get("/api/recipes/facets", headers=auth_headers).json()
+    assert data["total"] == 3
+    assert data["favorites"] == 1
+    assert data["tags"] == [{"value": "spicy", "count": 2}, {"value": "beef", "count": 1}]
+    assert data["difficulties"] == [{"value": "easy", "count": 2}, {"value": "hard", "count": 1}]
+    assert data["folders"] == [{"id": folder_id, "name": "Dinner", "count": 1}]
+    
+    data = client.get("/api/recipes/facets?tag=spicy&difficulty=easy", headers=auth_headers).json()
+    assert data["total"] == 1
+    assert data["tags"] == [{"value": "beef", "count": 1}, {"value": "spicy", "count": 1}]
+
+def test_recipe_write_cost_does_not_grow_with_tags_and_folders(client, auth_headers, count_user_queries):
+    folder_ids = [
+        client.post("/api/folders", json={"name": f"Folder {i}"}, headers=auth_headers).json()["id"]
+        for i in range(6)
+    ]
+    client.post("/api/recipes", json={"title": "Warm up", "tags": ["existing"]}, headers=auth_headers)
+    
+    small, _ = count_user_queries(
+        "/api/recipes", method="post",
+        json={"title": "Small", "tags": ["one"], "folder_ids": folder_ids[:1]}
+    )
+    large, data = count_user_queries(
+        "/api/recipes", method="post",
+        json={"title": "Large", "tags": ["existing", "a", "b", "c", "d", "A"], "folder_ids": folder_ids + [999]}
+    )
+    
+    assert small == large
+    assert sorted(tag["name"] for tag in data["tags"]) == ["a", "b", "c", "d", "existing"]
+    assert len(data["folders"]) == 6
+    assert data["unknown_folder_ids"] == [999]
+
+def test_update_recipe_only_touches_changed_children(client, auth_headers):
+    created = client.post(
+        "/api/recipes",
+        json={
+            "title": "Bread",
+            "ingredients": [{"name": "Flour"}, {"name": "Water"}, {"name": "Salt"}],
+            "instructions": [
+                {"step_number": 1, "content": "Mix"},
+                {"step_number": 2, "content": "Knead"},
+                {"step_number": 3, "content": "Bake"}
+            ]
+        },
+        headers=auth_headers
+    ).json()
+    ingredient_ids = [ing["id"] for ing in created["ingredients"]]
+    
+    from sqlalchemy import event
+    from app.user_database import get_user_engine
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    engine = get_user_engine("testuser")
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.put(
+            f"/api/recipes/{created['id']}",
+            json={"ingredients": [{"name": "Flour"}, {"name": "Warm water"}, {"name": "Salt"}]},
+            headers=auth_headers
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert [ing["id"] for ing in data["ingredients"]] == ingredient_ids
+    assert [ing["name"] for ing in data["ingredients"]] == ["Flour", "Warm water", "Salt"]
+    writes = [s for s in statements if s.startswith(("INSERT INTO ingredients", "UPDATE ingredients", "DELETE FROM ingredients"))]
+    assert len(writes) == 1 and writes[0].startswith("UPDATE ingredients")
+    
+    # Dropping the last ingredient deletes just that row
+    response = client.put(
+        f"/api/recipes/{created['id']}",
+        json={"ingredients": [{"id": ingredient_ids[0], "name": "Flour"}, {"id": ingredient_ids[2], "name": "Salt"}]},
+        headers=auth_headers
+    )
+    assert [ing["id"] for ing in response.json()["ingredients"]] == [ingredient_ids[0], ingredient_ids[2]]
+
+def test_patch_recipe(client, auth_headers):
+    created = client.post(
+        "/api/recipes",
+        json={
+            "title": "Tomato Soup",
+            "description": "Hearty",
+            "ingredients": [{"name": "Tomato"}],
+            "instructions": [{"step_number": 1, "content": "Chop"}, {"step_number": 2, "content": "Boil"}],
+            "tags": ["winter"]
+        },
+        headers=auth_headers
+    ).json()
+    instruction_ids = [inst["id"] for inst in created["instructions"]]
+    
+    response = client.patch(
+        f"/api/recipes/{created['id']}",
+        json=[
+            {"op": "replace", "path": "/instructions/1/content", "value": "Simmer"},
+            {"op": "add", "path": "/tags/-", "value": "vegan"},
+            {"op": "remove", "path": "/description"}
+        ],
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [inst["id"] for inst in data["instructions"]] == instruction_ids
+    assert data["instructions"][1]["content"] == "Simmer"
+    assert sorted(tag["name"] for tag in data["tags"]) == ["vegan", "winter"]
+    assert data["description"] is None
+    
+    response = client.patch(
+        f"/api/recipes/{created['id']}",
+        json=[{"op": "replace", "path": "/ingredients/5/name", "value": "Nope"}],
+        headers=auth_headers
+    )
+    assert response.status_code == 400
+    
+    # Paths into strings and null are not found, not substring matches
+    for operation in [
+        {"op": "add", "path": "/title/x", "value": "Nope"},
+        {"op": "replace", "path": "/title/T", "value": "Nope"},
+        {"op": "remove", "path": "/description/x"},
+        {"op": "replace", "path": "/ingredients/0/name/x", "value": "Nope"},
+    ]:
+        response = client.patch(f"/api/recipes/{created['id']}", json=[operation], headers=auth_headers)
+        assert response.status_code == 400, operation
+        assert "Path not found" in response.json()["detail"]
+    
+    response = client.patch(
+        f"/api/recipes/{created['id']}",
+        json=[{"op": "replace", "path": "/difficulty", "value": "impossible"}],
+        headers=auth_headers
+    )
+    assert response.status_code == 422
+
+def test_bulk_create_recipes(client, auth_headers, count_user_queries):
+    folder_id = client.post("/api/folders", json={"name": "Imported"}, headers=auth_headers).json()["id"]
+    
+    def payload(count):
+        return [
+            {
+                "title": f"Bulk {i}",
+                "ingredients": [{"name": "Rice"}, {"name": "Beans"}],
+                "instructions": [{"step_number": 1, "content": "Cook slowly"}],
+                "tags": ["batch", f"tag{i}"],
+                "folder_ids": [folder_id, 404]
+            }
+            for i in range(count)
+        ]
+    
+    small, _ = count_user_queries("/api/recipes/bulk", method="post", json=payload(2))
+    items = payload(20) + [{"title": ""}, {"description": "no title"}]
+    large, data = count_user_queries("/api/recipes/bulk", method="post", json=items)
+    
+    assert small == large
+    assert data["created"] == 20
+    assert data["failed"] == 2
+    assert data["items"][0]["unknown_folder_ids"] == [404]
+    assert data["items"][20]["id"] is None and data["items"][20]["errors"]
+    assert data["items"][21]["errors"][0].startswith("title")
+    
+    recipe = client.get(f"/api/recipes/{data['items'][3]['id']}", headers=auth_headers).json()
+    assert recipe["title"] == "Bulk 3"
+    assert len(recipe["ingredients"]) == 2
+    assert sorted(tag["name"] for tag in recipe["tags"]) == ["batch", "tag3"]
+    assert recipe["folders"] == [{"id": folder_id, "name": "Imported"}]
+    assert client.get("/api/recipes?search=slowly", headers=auth_headers).json()["total"] == 22
+
+def test_export_recipes(client, auth_headers):
+    import csv
+    import io
+    import json
+    import zipfile
+    from PIL import Image
+    
+    items = [
+        {"title": f"Export {i}", "ingredients": [{"name": "Salt", "unit": "pinch"}], "tags": ["exported"]}
+        for i in range(5)
+    ]
+    ids = [item["id"] for item in client.post("/api/recipes/bulk", json=items, headers=auth_headers).json()["items"]]
+    client.post(f"/api/recipes/{ids[0]}/favorite", headers=auth_headers)
+    image = io.BytesIO()
+    Image.new("RGB", (40, 30), "red").save(image, "PNG")
+    client.post(
+        f"/api/recipes/{ids[1]}/image",
+        files={"file": ("photo.png", image.getvalue(), "image/png")},
+        headers=auth_headers
+    )
+    wait_for_image_jobs()
+    
+    response = client.get("/api/recipes/export", headers=auth_headers)
+    assert response.headers["content-type"] == "application/x-ndjson"
+    recipes = [json.loads(line) for line in response.text.splitlines()]
+    assert [recipe["id"] for recipe in recipes] == ids
+    assert recipes[0]["is_favorite"] and not recipes[1]["is_favorite"]
+    assert recipes[2]["ingredients"][0]["unit"] == "pinch"
+    assert recipes[2]["tags"][0]["name"] == "exported"
+    
+    response = client.get("/api/recipes/export?format=csv", headers=auth_headers)
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 5
+    assert rows[0]["recipe_title"] == "Export 0" and rows[0]["name"] == "Salt"
+    
+    response = client.get("/api/recipes/export?format=zip", headers=auth_headers)
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    names = archive.namelist()
+    assert names[:2] == ["recipes.ndjson", "ingredients.csv"]
+    assert len(archive.read("recipes.ndjson").splitlines()) == 5
+    image_name = recipes[1]["image_url"].rsplit("/", 1)[1]
+    assert names[2:] == [f"images/{image_name}"]
+    assert archive.testzip() is None
+    
+    assert client.get("/api/recipes/export?format=xml", headers=auth_headers).status_code == 422
+
+def test_upload_image_is_processed_in_background(client, auth_headers, user_data_dir):
+    import io
+    import os
+    from PIL import Image
+    
+    def upload(recipe_id, data, name="photo.jpg"):
+        return client.post(
+            f"/api/recipes/{recipe_id}/image",
+            files={"file": (name, data, "image/jpeg")},
+            headers=auth_headers
+        ).json()
+    
+    def jpeg(width, height):
+        image = io.BytesIO()
+        Image.new("RGB", (width, height), "green").save(image, "JPEG")
+        return image.getvalue()
+    
+    recipe_id = client.post("/api/recipes", json={"title": "Photo"}, headers=auth_headers).json()["id"]
+    upload_dir = user_data_dir / "uploads" / "testuser"
+    
+    data = upload(recipe_id, jpeg(1600, 800))
+    assert data["image_status"] == "processing"
+    assert data["image_url"] is None
+    wait_for_image_jobs()
+    
+    recipe = client.get(f"/api/recipes/{recipe_id}", headers=auth_headers).json()
+    assert recipe["image_status"] == "ready"
+    first_files = set(os.listdir(upload_dir)) - {".incoming"}
+    stem = os.path.splitext(os.path.basename(recipe["image_url"]))[0]
+    with Image.open(upload_dir / f"{stem}.jpg") as img:
+        assert img.size == (1200, 600)
+    with Image.open(upload_dir / f"{stem}-320.webp") as img:
+        assert img.size == (320, 160)
+    base = f"/uploads/testuser/{stem}"
+    assert recipe["image_srcset"] == {
+        "image/jpeg": f"{base}-320.jpg 320w, {base}-640.jpg 640w, {base}.jpg 1200w",
+        "image/webp": f"{base}-320.webp 320w, {base}-640.webp 640w, {base}-1200.webp 1200w",
+    }
+    assert recipe["image_placeholder"].startswith("data:image/webp;base64,")
+    assert len(recipe["image_placeholder"]) < 1000
+    listed = client.get("/api/recipes", headers=auth_headers).json()["items"][0]
+    assert listed["image_srcset"] == recipe["image_srcset"]
+    assert listed["image_placeholder"] == recipe["image_placeholder"]
+    
+    # A replacement swaps in and removes the previous files; nothing is upscaled
+    upload(recipe_id, jpeg(300, 200))
+    wait_for_image_jobs()
+    recipe = client.get(f"/api/recipes/{recipe_id}", headers=auth_headers).json()
+    assert recipe["image_status"] == "ready"
+    assert first_files.isdisjoint(os.listdir(upload_dir))
+    assert list(recipe["image_srcset"]) == ["image/jpeg", "image/webp"]
+    assert recipe["image_srcset"]["image/webp"].endswith("-300.webp 300w")
+    current_url = recipe["image_url"]
+    current_files = set(os.listdir(upload_dir))
+    
+    # A corrupt image is reported and leaves the current image in place
+    upload(recipe_id, jpeg(300, 200)[:200])
+    wait_for_image_jobs()
+    recipe = client.get(f"/api/recipes/{recipe_id}", headers=auth_headers).json()
+    assert recipe["image_status"] == "failed"
+    assert recipe["image_url"] == current_url
+    assert set(os.listdir(upload_dir)) == current_files
+    assert os.listdir(upload_dir / ".incoming") == []
+    
+    client.delete(f"/api/recipes/{recipe_id}", headers=auth_headers)
+    assert os.listdir(upload_dir) == [".incoming"]
+
+def test_image_job_marks_recipe_failed_when_result_cannot_be_recorded(client, auth_headers, monkeypatch):
+    import io
+    from PIL import Image
+    from app import image_jobs
+    from app.user_database import UserDatabaseBusy
+    
+    finish = image_jobs.finish_image_job
+    attempts = []
+    
+    def busy_finish(username, digest, filename, result=None, job=None):
+        if filename is not None:
+            attempts.append(digest)
+            raise UserDatabaseBusy()
+        finish(username, digest, filename, result, job)
+    
+    monkeypatch.setattr(image_jobs, "finish_image_job", busy_finish)
+    monkeypatch.setattr(image_jobs, "FINISH_RETRY_DELAY", 0)
+    image = io.BytesIO()
+    Image.new("RGB", (400, 300), "purple").save(image, "PNG")
+    recipe_id = client.post("/api/recipes", json={"title": "Busy"}, headers=auth_headers).json()["id"]
+    client.post(
+        f"/api/recipes/{recipe_id}/image",
+        files={"file": ("photo.png", image.getvalue(), "image/png")},
+        headers=auth_headers
+    )
+    wait_for_image_jobs()
+    
+    assert len(attempts) == image_jobs.FINISH_ATTEMPTS
+    recipe = client.get(f"/api/recipes/{recipe_id}", headers=auth_headers).json()
+    assert recipe["image_status"] == "failed"
+
+def test_identical_uploads_share_one_stored_image(client, auth_headers, user_data_dir):
+    import io
+    import os
+    from PIL import Image
+    from app.user_database import ImageBlob, get_user_session_factory
+    
+    image = io.BytesIO()
+    Image.new("RGB", (700, 500), "orange").save(image, "PNG")
+    
+    def upload(recipe_id, name="photo.png"):
+        return client.post(
+            f"/api/recipes/{recipe_id}/image",
+            files={"file": (name, image.getvalue(), "image/png")},
+            headers=auth_headers
+        ).json()
+    
+    ids = [client.post("/api/recipes", json={"title": f"Dish {i}"}, headers=auth_headers).json()["id"] for i in range(3)]
+    upload(ids[0])
+    upload(ids[1], name="copy.png")
+    wait_for_image_jobs()
+    
+    # Content already processed is attached straight away
+    third = upload(ids[2])
+    assert third["image_status"] == "ready"
+    first = client.get(f"/api/recipes/{ids[0]}", headers=auth_headers).json()
+    second = client.get(f"/api/recipes/{ids[1]}", headers=auth_headers).json()
+    assert first["image_url"] == second["image_url"] == third["image_url"]
+    assert first["image_srcset"] == third["image_srcset"]
+    assert first["image_placeholder"] == third["image_placeholder"] is not None
+    
+    upload_dir = user_data_dir / "uploads" / "testuser"
+    stored = set(os.listdir(upload_dir)) - {".incoming"}
+    assert len(stored) == 6  # 700px png, two narrower pngs and three webps
+    
+    db = get_user_session_factory("testuser")()
+    assert [blob.ref_count for blob in db.query(ImageBlob)] == [3]
+    db.close()
+    
+    # Files go with the last reference
+    client.delete(f"/api/recipes/{ids[0]}", headers=auth_headers)
+    client.delete(f"/api/recipes/{ids[1]}", headers=auth_headers)
+    assert set(os.listdir(upload_dir)) - {".incoming"} == stored
+    client.delete(f"/api/recipes/{ids[2]}", headers=auth_headers)
+    assert os.listdir(upload_dir) == [".incoming"]
+    db = get_user_session_factory("testuser")()
+    assert db.query(ImageBlob).count() == 0
+    db.close()
+
+def test_reupload_while_failed_job_finishes_is_queued(client, auth_headers, monkeypatch):
+    import io
+    from PIL import Image
+    from app import image_jobs
+    
+    image = io.BytesIO()
+    Image.new("RGB", (300, 200), "gray").save(image, "JPEG")
+    corrupt = image.getvalue()[:200]
+    recipe_id = client.post("/api/recipes", json={"title": "Retry"}, headers=auth_headers).json()["id"]
+    
+    def upload():
+        return client.post(
+            f"/api/recipes/{recipe_id}/image",
+            files={"file": ("photo.jpg", corrupt, "image/jpeg")},
+            headers=auth_headers
+        ).json()
+    
+    # Upload the same content again right after the failed job has committed
+    record = image_jobs._record_result
+    reuploads = []
+    
+    def record_then_reupload(*args):
+        record(*args)
+        if not reuploads:
+            reuploads.append(upload())
+    
+    monkeypatch.setattr(image_jobs, "_record_result", record_then_reupload)
+    upload()
+    wait_for_image_jobs()
+    wait_for_image_jobs()
+    
+    assert reuploads[0]["image_status"] == "processing"
+    recipe = client.get(f"/api/recipes/{recipe_id}", headers=auth_headers).json()
+    assert recipe["image_status"] == "failed"
+
+def test_upload_image_is_validated_while_streaming(client, auth_headers, user_data_dir, monkeypatch):
+    import os
+    from app.config import settings
+    
+    recipe_id = client.post("/api/recipes", json={"title": "Photo"}, headers=auth_headers).json()["id"]
+    
+    def upload(data, name="photo.jpg", **kwargs):
+        return client.post(
+            f"/api/recipes/{recipe_id}/image",
+            files={"file": (name, data, "image/jpeg")},
+            headers=auth_headers,
+            **kwargs
+        )
+    
+    # The type comes from the content, not the name
+    response = upload(b"<html>not an image</html>", name="photo.png")
+    assert response.status_code == 400
+    assert "not a supported image" in response.json()["detail"]
+    assert upload(b"").status_code == 400
+    
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+    # Rejected from Content-Length before the body is read...
+    assert upload(b"\xff\xd8\xff" + b"0" * 64 * 1024).status_code == 413
+    
+    # ...and while streaming when the length is not known up front
+    def body():
+        yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.jpg\"\r\n\r\n"
+        yield b"\xff\xd8\xff" + b"0" * 2048
+        yield b"\r\n--b--\r\n"
+    response = client.post(
+        f"/api/recipes/{recipe_id}/image",
+        content=body(),
+        headers={**auth_headers, "Content-Type": "multipart/form-data; boundary=b"}
+    )
+    assert response.status_code == 413
+    
+    assert client.post(
+        "/api/recipes/9999/image", files={"file": ("a.jpg", b"\xff\xd8\xff")}, headers=auth_headers
+    ).status_code == 404
+    assert os.listdir(user_data_dir / "uploads" / "testuser" / ".incoming") == []
+    recipe = client.get(f"/api/recipes/{recipe_id}", headers=auth_headers).json()
+    assert recipe["image_status"] is None
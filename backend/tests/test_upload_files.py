@@ -0,0 +1,57 @@
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from app import upload_files
+from app.upload_files import IMMUTABLE_CACHE_CONTROL, UploadFiles
+
+DIGEST = "ab" * 32
+
+
+def make_client(tmp_path):
+    user_dir = tmp_path / "alice"
+    (user_dir / ".incoming").mkdir(parents=True)
+    (user_dir / f"{DIGEST}.jpg").write_bytes(b"x" * 1000)
+    (user_dir / f"{DIGEST}-320.webp").write_bytes(b"y" * 100)
+    (user_dir / "legacy-uuid.jpg").write_bytes(b"z" * 10)
+    (user_dir / ".incoming" / DIGEST).write_bytes(b"staged")
+    return TestClient(Starlette(routes=[Mount("/uploads", app=UploadFiles(directory=str(tmp_path)))]))
+
+
+def test_content_named_files_are_immutable(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_files, "_stats", dict.fromkeys(upload_files._stats, 0))
+    client = make_client(tmp_path)
+    
+    response = client.get(f"/uploads/alice/{DIGEST}.jpg")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["etag"] == f'"{DIGEST}"'
+    assert client.get(f"/uploads/alice/{DIGEST}-320.webp").headers["etag"] == f'"{DIGEST}-320"'
+    
+    # Files that are not content-named keep the default revalidating behaviour
+    legacy = client.get("/uploads/alice/legacy-uuid.jpg")
+    assert "cache-control" not in legacy.headers
+    
+    response = client.get(f"/uploads/alice/{DIGEST}.jpg", headers={"If-None-Match": f'"{DIGEST}"'})
+    assert response.status_code == 304
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.content == b""
+    
+    response = client.get(f"/uploads/alice/{DIGEST}.jpg", headers={"Range": "bytes=0-99"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 0-99/1000"
+    assert len(response.content) == 100
+    # A stale If-Range falls back to the whole file
+    response = client.get(f"/uploads/alice/{DIGEST}.jpg", headers={"Range": "bytes=0-99", "If-Range": '"other"'})
+    assert response.status_code == 200
+    
+    assert client.get(f"/uploads/alice/.incoming/{DIGEST}").status_code == 404
+    
+    assert upload_files.get_upload_serving_stats() == {
+        "requests": 6,
+        "full": 4,
+        "partial": 1,
+        "not_modified": 1,
+        "bytes_sent": 1000 + 100 + 10 + 100 + 1000,
+        "bytes_saved": 1000 + 900,
+    }
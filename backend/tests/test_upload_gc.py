@@ -0,0 +1,83 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import upload_gc
+from app.user_database import ImageBlob, Recipe, create_user_database, get_user_session_factory
+from tests.conftest import TestingSessionLocal
+
+DIGEST = "cd" * 32
+PENDING = "ef" * 32
+
+
+def write(path, size, age=0):
+    path.write_bytes(b"x" * size)
+    if age:
+        past = time.time() - age
+        os.utime(path, (past, past))
+
+
+def test_sweep_removes_only_old_unreferenced_files(user_data_dir):
+    create_user_database("alice")
+    upload_dir = user_data_dir / "uploads" / "alice"
+    incoming_dir = upload_dir / ".incoming"
+    incoming_dir.mkdir()
+    db = get_user_session_factory("alice")()
+    db.add(ImageBlob(hash=DIGEST, filename=f"{DIGEST}.jpg", variants='{"image/webp": {"320": "' + DIGEST + '-320.webp"}}', ref_count=1))
+    db.add(ImageBlob(hash=PENDING, ref_count=0))
+    db.add(Recipe(title="Blob", image_url=f"/uploads/alice/{DIGEST}.jpg", image_hash=DIGEST))
+    db.add(Recipe(title="Legacy", image_url="/uploads/alice/legacy.jpg"))
+    db.commit()
+    db.close()
+
+    for name in (f"{DIGEST}.jpg", f"{DIGEST}-320.webp", "legacy.jpg"):
+        write(upload_dir / name, 10, age=7200)
+    write(incoming_dir / PENDING, 10, age=7200)
+    write(upload_dir / "orphan.jpg", 100, age=7200)
+    write(incoming_dir / "crashed.partial", 50, age=7200)
+    write(upload_dir / "in-flight.jpg", 100)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        dry = upload_gc.sweep_user_uploads("alice", pool, grace_seconds=3600, batch_size=1, dry_run=True)
+        assert (upload_dir / "orphan.jpg").exists()
+        counts = upload_gc.sweep_user_uploads("alice", pool, grace_seconds=3600, batch_size=1)
+
+    assert dry == counts == {"unreferenced": 3, "removed": 2, "kept_recent": 1, "bytes_reclaimed": 150}
+    assert sorted(os.listdir(upload_dir)) == [
+        ".incoming", f"{DIGEST}-320.webp", f"{DIGEST}.jpg", "in-flight.jpg", "legacy.jpg"
+    ]
+    assert os.listdir(incoming_dir) == [PENDING]
+
+
+def test_sweep_removes_directories_of_deleted_users(user_data_dir, db, monkeypatch):
+    monkeypatch.setattr(upload_gc, "SessionLocal", TestingSessionLocal)
+    ghost_dir = user_data_dir / "uploads" / "ghost"
+    (ghost_dir / ".incoming").mkdir(parents=True)
+    write(ghost_dir / "left-behind.jpg", 40, age=7200)
+
+    results = upload_gc.sweep_all_uploads(grace_seconds=3600)
+
+    assert results["ghost"]["bytes_reclaimed"] == 40
+    assert not ghost_dir.exists()
+    assert upload_gc.get_upload_gc_stats()["sweeps"] >= 1
+
+
+def test_sweep_carries_on_after_a_failing_user(user_data_dir, monkeypatch):
+    for username in ("alice", "bob"):
+        create_user_database(username)
+        write(user_data_dir / "uploads" / username / "orphan.jpg", 10, age=7200)
+    referenced = upload_gc.referenced_files
+
+    def corrupt_alice(username, batch_size):
+        if username == "alice":
+            raise RuntimeError("file is not a database")
+        return referenced(username, batch_size)
+
+    monkeypatch.setattr(upload_gc, "referenced_files", corrupt_alice)
+    errors = upload_gc.get_upload_gc_stats()["errors"]
+
+    results = upload_gc.sweep_all_uploads(grace_seconds=3600)
+
+    assert results["alice"] == {"error": "file is not a database"}
+    assert results["bob"]["removed"] == 1
+    assert upload_gc.get_upload_gc_stats()["errors"] == errors + 1
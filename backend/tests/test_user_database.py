@@ -0,0 +1,134 @@
+import sqlite3
+import time
+
+import pytest
+
+from app import user_database
+from app.config import settings
+
+
+LEGACY_SCHEMA = """
+CREATE TABLE recipes (
+    id INTEGER PRIMARY KEY, title VARCHAR(255) NOT NULL, description TEXT, image_url VARCHAR(500),
+    prep_time INTEGER, cook_time INTEGER, servings INTEGER, difficulty VARCHAR(50),
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), updated_at DATETIME
+);
+CREATE TABLE folders (
+    id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, description TEXT,
+    parent_id INTEGER REFERENCES folders (id) ON DELETE CASCADE,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
+);
+CREATE TABLE recipe_folder_association (
+    recipe_id INTEGER REFERENCES recipes (id) ON DELETE CASCADE,
+    folder_id INTEGER REFERENCES folders (id) ON DELETE CASCADE
+);
+INSERT INTO recipes (id, title) VALUES (1, 'Legacy Chili');
+INSERT INTO folders (id, name) VALUES (1, 'Dinner');
+INSERT INTO recipe_folder_association VALUES (1, 1);
+INSERT INTO recipe_folder_association VALUES (1, 1);
+-- Written without foreign key enforcement: the recipe and folder are gone
+INSERT INTO recipe_folder_association VALUES (99, 1);
+INSERT INTO recipe_folder_association VALUES (1, 99);
+"""
+
+
+def test_new_database_is_at_current_schema_version():
+    engine = user_database.get_user_engine("freshuser")
+    with engine.connect() as conn:
+        assert user_database.get_user_schema_version(conn) == user_database.USER_SCHEMA_VERSION
+
+
+def test_legacy_database_is_migrated_on_first_open():
+    conn = sqlite3.connect(user_database.get_user_db_path("legacyuser"))
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+    
+    engine = user_database.get_user_engine("legacyuser")
+    
+    with engine.connect() as conn:
+        assert user_database.get_user_schema_version(conn) == user_database.USER_SCHEMA_VERSION
+        rows = conn.exec_driver_sql("SELECT recipe_id, folder_id FROM recipe_folder_association").all()
+        assert rows == [(1, 1)]
+        indexes = {row[1] for row in conn.exec_driver_sql("SELECT type, name FROM sqlite_master WHERE type = 'index'")}
+        assert "ix_recipes_created_at_id" in indexes
+        assert "ix_ingredients_recipe_id" in indexes
+        assert "ix_recipe_folder_association_folder_id" in indexes
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT id FROM recipes ORDER BY created_at DESC, id DESC LIMIT 12"
+        ).all()
+        assert "ix_recipes_created_at_id" in " ".join(str(row[-1]) for row in plan)
+        # The search index is backfilled for recipes that predate it
+        assert conn.exec_driver_sql("SELECT rowid FROM recipe_search WHERE recipe_search MATCH 'chili'").all() == [(1,)]
+        # Each migration adds its own columns; together they bring the tables up to the models
+        for table in (user_database.Recipe.__table__, user_database.ImageBlob.__table__):
+            columns = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+            assert columns == {column.name for column in table.columns}
+
+
+def test_engine_cache_evicts_least_recently_used():
+    cache = user_database.UserEngineCache(max_size=2, idle_timeout=600)
+    
+    first, _ = cache.get("alice")
+    cache.get("bob")
+    assert cache.get("alice")[0] is first
+    cache.get("carol")  # evicts bob, the least recently used
+    
+    assert cache.stats() == {"size": 2, "max_size": 2, "hits": 1, "misses": 3, "evictions": 1}
+    assert cache.get("alice")[0] is first
+    assert cache.stats()["misses"] == 3
+    cache.get("bob")
+    assert cache.stats()["misses"] == 4
+    cache.clear()
+
+
+def test_engine_cache_evicts_idle_engines():
+    cache = user_database.UserEngineCache(max_size=10, idle_timeout=0)
+    cache.get("alice")
+    cache.get("bob")
+    
+    stats = cache.stats()
+    assert stats["size"] == 1
+    assert stats["evictions"] == 1
+    cache.clear()
+
+
+def test_engine_cache_evicts_idle_engines_on_hits():
+    cache = user_database.UserEngineCache(max_size=10, idle_timeout=600)
+    cache.get("alice")
+    cache.get("bob")
+    cache.idle_timeout = 0
+    
+    cache.get("bob")  # a hit, with no new user to trigger eviction
+    assert cache.stats()["size"] == 1
+    assert cache.stats()["evictions"] == 1
+    cache.clear()
+
+
+def test_user_engine_applies_sqlite_profile():
+    engine = user_database.get_user_engine("pragmauser")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+
+def test_write_gives_up_after_max_wait(monkeypatch):
+    monkeypatch.setattr(settings, "USER_WRITE_RETRIES", 100)
+    monkeypatch.setattr(settings, "USER_WRITE_MAX_WAIT", 0.3)
+    user_database.get_user_engine("lockeduser")
+    other = sqlite3.connect(user_database.get_user_db_path("lockeduser"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    started = time.monotonic()
+    try:
+        with pytest.raises(user_database.UserDatabaseBusy):
+            with user_database.user_write_session("lockeduser"):
+                pass
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    
+    # Well short of the 5 s busy timeout, let alone 100 retries of it
+    assert time.monotonic() - started < 2
+    with user_database.get_user_engine("lockeduser").connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
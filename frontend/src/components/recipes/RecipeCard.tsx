@@ -4,6 +4,9 @@ import { cn, formatTime, getDifficultyColor, getImageUrl } from '@/lib/utils';
 import { useToggleFavorite } from '@/hooks/useRecipes';
 import type { RecipeListItem } from '@/types';
 
+// Matches the recipe grids: one column on phones, up to four on wide screens
+const CARD_IMAGE_SIZES = '(min-width: 1280px) 25vw, (min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw';
+
 interface RecipeCardProps {
   recipe: RecipeListItem;
 }
@@ -23,14 +26,22 @@ export default function RecipeCard({ recipe }: RecipeCardProps) {
       to={`/recipes/${recipe.id}`}
       className="card group overflow-hidden hover:shadow-md transition-shadow"
     >
-      <div className="relative aspect-video bg-gray-100 dark:bg-gray-700 overflow-hidden">
+      <div
+        className="relative aspect-video bg-gray-100 dark:bg-gray-700 bg-cover bg-center overflow-hidden"
+        style={recipe.image_placeholder ? { backgroundImage: `url(${recipe.image_placeholder})` } : undefined}
+      >
         {recipe.image_url ? (
-          <img
-            src={getImageUrl(recipe.image_url)}
-            alt={recipe.title}
-            className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300"
-            loading="lazy"
-          />
+          <picture>
+            {Object.entries(recipe.image_srcset ?? {}).map(([type, srcSet]) => (
+              <source key={type} type={type} srcSet={srcSet} sizes={CARD_IMAGE_SIZES} />
+            ))}
+            <img
+              src={getImageUrl(recipe.image_url)}
+              alt={recipe.title}
+              className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300"
+              loading="lazy"
+            />
+          </picture>
         ) : (
           <div className="w-full h-full flex items-center justify-center">
             <ChefHat className="h-12 w-12 text-gray-300 dark:text-gray-600" />
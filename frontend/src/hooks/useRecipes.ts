@@ -1,7 +1,7 @@
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import toast from 'react-hot-toast';
 import api, { handleApiError } from '@/lib/api';
-import type { Recipe, RecipeListItem, RecipeCreateInput, RecipeFilters, PaginatedResponse } from '@/types';
+import type { Recipe, RecipeListItem, RecipeCreateInput, RecipeFilters, RecipeFacets, PaginatedResponse } from '@/types';
 
 export function useRecipes(filters: RecipeFilters = {}) {
   return useQuery({
@@ -10,6 +10,7 @@ export function useRecipes(filters: RecipeFilters = {}) {
       const params = new URLSearchParams();
       if (filters.search) params.append('search', filters.search);
       if (filters.folder_id) params.append('folder_id', String(filters.folder_id));
+      if (filters.include_subfolders) params.append('include_subfolders', 'true');
       if (filters.tag) params.append('tag', filters.tag);
       if (filters.difficulty) params.append('difficulty', filters.difficulty);
       if (filters.favorites_only) params.append('favorites_only', 'true');
@@ -151,6 +152,24 @@ export function useTags() {
   });
 }
 
+export function useRecipeFacets(filters: RecipeFilters = {}) {
+  return useQuery({
+    queryKey: ['recipes', 'facets', filters],
+    queryFn: async () => {
+      const params = new URLSearchParams();
+      if (filters.search) params.append('search', filters.search);
+      if (filters.folder_id) params.append('folder_id', String(filters.folder_id));
+      if (filters.include_subfolders) params.append('include_subfolders', 'true');
+      if (filters.tag) params.append('tag', filters.tag);
+      if (filters.difficulty) params.append('difficulty', filters.difficulty);
+      if (filters.favorites_only) params.append('favorites_only', 'true');
+      
+      const response = await api.get<RecipeFacets>(`/recipes/facets?${params}`);
+      return response.data;
+    },
+  });
+}
+
 export function useAddToFolder() {
   const queryClient = useQueryClient();
   
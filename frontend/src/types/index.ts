@@ -33,6 +33,9 @@ export interface Recipe {
   title: string;
   description: string | null;
   image_url: string | null;
+  image_status?: 'processing' | 'ready' | 'failed' | null;
+  image_srcset?: Record<string, string>;
+  image_placeholder?: string | null;
   prep_time: number | null;
   cook_time: number | null;
   servings: number | null;
@@ -44,6 +47,7 @@ export interface Recipe {
   tags: Tag[];
   folders?: Folder[];
   is_favorite: boolean;
+  unknown_folder_ids?: number[];
 }
 
 export interface RecipeListItem {
@@ -51,11 +55,15 @@ export interface RecipeListItem {
   title: string;
   description: string | null;
   image_url: string | null;
+  image_status?: 'processing' | 'ready' | 'failed' | null;
+  image_srcset?: Record<string, string>;
+  image_placeholder?: string | null;
   prep_time: number | null;
   cook_time: number | null;
   difficulty: 'easy' | 'medium' | 'hard' | null;
   created_at: string;
   is_favorite: boolean;
+  search_snippet?: string | null;
 }
 
 export interface Folder {
@@ -65,6 +73,7 @@ export interface Folder {
   parent_id: number | null;
   created_at: string;
   recipe_count: number;
+  total_recipe_count?: number;
   children?: Folder[];
 }
 
@@ -76,6 +85,19 @@ export interface PaginatedResponse<T> {
   pages: number;
 }
 
+export interface FacetCount {
+  value: string;
+  count: number;
+}
+
+export interface RecipeFacets {
+  total: number;
+  favorites: number;
+  tags: FacetCount[];
+  difficulties: FacetCount[];
+  folders: { id: number; name: string; count: number }[];
+}
+
 export interface AuthTokens {
   access_token: string;
   refresh_token: string;
@@ -111,6 +133,7 @@ export interface InstructionInput {
 export interface RecipeFilters {
   search?: string;
   folder_id?: number;
+  include_subfolders?: boolean;
   tag?: string;
   difficulty?: string;
   favorites_only?: boolean;